@@ -0,0 +1,180 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
+import pandas as pd
+
+
+class AnnotationIndex():
+    """
+        Index of annotations sorted by time. Range queries use binary search
+        over the sorted times and an inverted index maps each annotation text
+        to the sorted times it occurs at, so both kinds of query cost
+        O(log n) plus the size of the result.
+
+        Inserting or deleting an annotation keeps both indexes sorted. If
+        on_change is given it is called without arguments after every insert
+        or delete.
+    """
+
+    def __init__(self, times=(), texts=(), on_change=None):
+        times = np.asarray(times, dtype="float64")
+        texts = ["" if text is None or text != text else str(text)
+                 for text in texts]
+        if len(times) != len(texts):
+            raise Exception("times and texts must have the same length.")
+
+        # Stable sort keeps annotations at the same time in their order
+        order = np.argsort(times, kind="stable")
+        self._times = times[order].tolist()
+        self._texts = [texts[idx] for idx in order]
+        self._by_text = {}
+        for time, text in zip(self._times, self._texts):
+            self._by_text.setdefault(_key(text), []).append(time)
+        self.on_change = on_change
+
+    @classmethod
+    def from_frame(cls, df_ann, on_change=None):
+        """
+            Builds the index from an annotation dataframe indexed by time with
+            a Text column.
+        """
+
+        if df_ann is None:
+            return cls(on_change=on_change)
+        return cls(df_ann.index.values, df_ann["Text"].tolist(), on_change)
+
+    def __repr__(self):
+        """
+            String representation of the AnnotationIndex object.
+        """
+        expression = (f"AnnotationIndex(annotations={len(self)}, "
+                      f"texts={len(self._by_text)})")
+        return expression
+
+    def __len__(self):
+        return len(self._times)
+
+    def __iter__(self):
+        """
+            Iterates over (time, text) pairs in order of time.
+        """
+        return zip(self._times, self._texts)
+
+    @property
+    def times(self):
+        """
+            Sorted times of all annotations as an array.
+        """
+        return np.array(self._times, dtype="float64")
+
+    @property
+    def texts(self):
+        """
+            Distinct annotation texts.
+        """
+        return list(self._by_text)
+
+    def locate(self, time_start, time_end):
+        """
+            Returns the positions [first, last) of the annotations within
+            time_start <= time < time_end.
+        """
+
+        first = bisect_left(self._times, time_start)
+        last = bisect_left(self._times, time_end, lo=first)
+        return first, last
+
+    def range(self, time_start, time_end):
+        """
+            Returns the annotations within time_start <= time < time_end.
+
+            Arguments:
+            ----------
+            time_start {float} -- start of the range in SS.SS.
+
+            time_end {float} -- end of the range in SS.SS.
+
+            Returns:
+            --------
+            times {list float} -- sorted times of the annotations.
+
+            texts {list string} -- text of each annotation.
+        """
+
+        first, last = self.locate(time_start, time_end)
+        return self._times[first:last], self._texts[first:last]
+
+    def find(self, text, time_start=-np.inf, time_end=np.inf):
+        """
+            Returns the sorted times of the annotations with text, optionally
+            limited to time_start <= time < time_end. Leading and trailing
+            whitespace is ignored.
+        """
+
+        times = self._by_text.get(_key(text), [])
+        first = bisect_left(times, time_start)
+        last = bisect_left(times, time_end, lo=first)
+        return times[first:last]
+
+    def insert(self, time, text):
+        """
+            Inserts an annotation. Annotations at the same time keep the order
+            they were inserted in.
+        """
+
+        time, text = float(time), str(text)
+        idx = bisect_right(self._times, time)
+        self._times.insert(idx, time)
+        self._texts.insert(idx, text)
+        times = self._by_text.setdefault(_key(text), [])
+        times.insert(bisect_right(times, time), time)
+        self._changed()
+
+    def delete(self, time, text=None):
+        """
+            Deletes the first annotation at time, or the first annotation at
+            time with text if given. Returns False if there is no such
+            annotation.
+        """
+
+        time = float(time)
+        first = bisect_left(self._times, time)
+        last = bisect_right(self._times, time, lo=first)
+        for idx in range(first, last):
+            if text is None or _key(self._texts[idx]) == _key(text):
+                break
+        else:
+            return False
+
+        removed = self._texts.pop(idx)
+        del self._times[idx]
+        times = self._by_text[_key(removed)]
+        del times[bisect_left(times, time)]
+        if not times:
+            del self._by_text[_key(removed)]
+        self._changed()
+        return True
+
+    def to_frame(self):
+        """
+            Returns the annotations as a dataframe indexed by time with a Text
+            column.
+        """
+
+        index = pd.Index(self._times, dtype="float64", name="Time")
+        return pd.DataFrame({"Text": pd.Series(self._texts, index=index,
+                                               dtype="object")})
+
+    def _changed(self):
+        """
+            Notifies the owner of the index after an insert or delete.
+        """
+
+        if self.on_change is not None:
+            self.on_change()
+
+
+def _key(text):
+    """
+        Key of an annotation text in the inverted index.
+    """
+    return str(text).strip()
@@ -0,0 +1,263 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from . import storage
+
+
+class Cache():
+    """
+        On-disk cache of imported text files. Stores the pressure matrix, the
+        time index and the annotations of a text file in a binary .hrmcache
+        file so the file does not have to be parsed again.
+
+        Cache files are keyed on the path, size, modification time and content
+        hash of the source file and are ignored automatically once the source
+        changes. If cache_dir is not given the cache file is written next to
+        the source file. Otherwise the files are stored in cache_dir and the
+        least recently used files are deleted once the total size of the
+        directory exceeds max_size bytes.
+    """
+
+    extension = ".hrmcache"
+    version = 3
+
+    def __init__(self, cache_dir=None, max_size=2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_size = int(max_size)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __repr__(self):
+        """
+            String representation of the Cache object.
+        """
+        expression = (f"Cache(cache_dir={self.cache_dir}, "
+                      f"max_size={self.max_size})")
+        return expression
+
+    def path_for(self, file_path):
+        """
+            Returns the location of the cache file for the source file_path.
+        """
+
+        file_path = os.path.abspath(file_path)
+        if not self.cache_dir:
+            return file_path + self.extension
+
+        # Name the cache file after a digest of the full source path so files
+        # with the same name in different folders do not collide.
+        digest = hashlib.sha1(file_path.encode("utf-8")).hexdigest()[:16]
+        name = f"{digest}-{os.path.basename(file_path)}{self.extension}"
+        return os.path.join(self.cache_dir, name)
+
+    def load(self, file_path, dtype="float64", scale=None):
+        """
+            Loads the cached data of file_path.
+
+            Arguments:
+            ----------
+            file_path {string} -- path of the source txt file.
+
+            dtype {string} -- Optional. Numeric type of the returned pressures.
+
+            scale {float} -- Optional. Scale factor if dtype is an integer
+            type.
+
+            Returns:
+            --------
+            data {tuple | None} -- (df_HRM, df_ann, values_3d) if a valid
+            cache file exists. None if there is no cache file or it is out of
+            date.
+        """
+
+        cache_path = self.path_for(file_path)
+        if not os.path.exists(cache_path):
+            return None
+
+        try:
+            with np.load(cache_path, allow_pickle=False) as arrays:
+                key = json.loads(bytes(arrays["key"]).decode("utf-8"))
+                if not self._is_valid(key, file_path):
+                    return None
+                times = arrays["times"]
+                stored_scale = float(arrays["scale"]) or None
+                values = storage.convert(arrays["values"], stored_scale,
+                                         dtype, scale)
+                columns = arrays["columns"].tolist()
+                ann_times = arrays["ann_times"]
+                ann_text = arrays["ann_text"].tolist()
+                values_3d = None
+                if "values_3d" in arrays.files:
+                    values_3d = storage.convert(arrays["values_3d"],
+                                                stored_scale, dtype, scale)
+        except Exception:
+            # Unreadable or partially written cache file. Treat as a miss.
+            return None
+
+        # Mark the cache file as recently used for eviction. Best effort: the
+        # file may have been evicted by another process since it was read, or
+        # the cache may be read only.
+        try:
+            os.utime(cache_path)
+        except OSError:
+            pass
+
+        df_HRM = pd.DataFrame(values,
+                              index=pd.Index(times, name="Time", copy=False),
+                              columns=columns, copy=False)
+        ann_index = pd.Index(ann_times, name="Time")
+        df_ann = pd.DataFrame({"Text": pd.Series(ann_text, index=ann_index,
+                                                 dtype="object")})
+        return df_HRM, df_ann, values_3d
+
+    def store(self, file_path, df_HRM, df_ann, scale=None, values_3d=None):
+        """
+            Writes the imported data of file_path to its cache file. Evicts old
+            cache files afterwards if a cache directory is used. Writing is
+            best effort: if the cache file cannot be written, for example
+            next to a file on a read only drive or on a full disk, nothing is
+            cached and the import carries on.
+
+            Arguments:
+            ----------
+            file_path {string} -- path of the source txt file.
+
+            df_HRM {pandas dataframe} -- imported pressure data.
+
+            df_ann {pandas dataframe} -- imported annotations.
+
+            scale {float} -- Optional. Scale factor if the pressures are stored
+            as integers.
+
+            values_3d {numpy array} -- Optional. Imported 3D sensor pressures.
+
+            Returns:
+            --------
+            cache_path {string} -- location of the written cache file or None
+            if it could not be written.
+        """
+
+        cache_path = self.path_for(file_path)
+        key = self._key(file_path, digest=True)
+        arrays = {
+            "key": np.frombuffer(json.dumps(key).encode("utf-8"),
+                                 dtype="uint8"),
+            "times": df_HRM.index.values.astype("float64", copy=False),
+            "values": np.ascontiguousarray(df_HRM.to_numpy()),
+            "columns": np.asarray(df_HRM.columns, dtype="int64"),
+            "scale": np.array(scale or 0.0),
+            "ann_times": df_ann.index.values.astype("float64", copy=False),
+            "ann_text": df_ann["Text"].fillna("").to_numpy(dtype="str"),
+        }
+        if values_3d is not None:
+            arrays["values_3d"] = values_3d
+
+        # Write to a temporary file first so a reader never sees a partially
+        # written cache file.
+        temp_path = cache_path + ".tmp"
+        try:
+            with open(temp_path, "wb") as file:
+                np.savez(file, **arrays)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # Remove what was written of the temporary file
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return None
+
+        if self.cache_dir:
+            try:
+                self.evict()
+            except OSError:
+                pass
+
+        return cache_path
+
+    def evict(self):
+        """
+            Deletes the least recently used cache files in cache_dir until the
+            total size is no more than max_size.
+        """
+
+        if not self.cache_dir:
+            return
+
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(self.extension):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self, file_path=None):
+        """
+            Deletes the cache file of file_path. If no file_path is given all
+            cache files in cache_dir are deleted.
+        """
+
+        if file_path:
+            paths = [self.path_for(file_path)]
+        elif self.cache_dir:
+            paths = [entry.path for entry in os.scandir(self.cache_dir)
+                     if entry.name.endswith(self.extension)]
+        else:
+            paths = []
+
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _key(self, file_path, digest=False):
+        """
+            Builds the key identifying the current state of the source file.
+        """
+
+        stat = os.stat(file_path)
+        key = {"version": self.version,
+               "path": os.path.abspath(file_path),
+               "size": stat.st_size,
+               "mtime": stat.st_mtime_ns}
+        if digest:
+            key["hash"] = _digest(file_path)
+        return key
+
+    def _is_valid(self, key, file_path):
+        """
+            Checks if a stored key still matches the source file. Matching size
+            and modification time are trusted. If only the modification time
+            changed the content hash decides.
+        """
+
+        current = self._key(file_path)
+        if (key.get("version") != current["version"]
+                or key.get("path") != current["path"]
+                or key.get("size") != current["size"]):
+            return False
+        if key.get("mtime") == current["mtime"]:
+            return True
+        return key.get("hash") == _digest(file_path)
+
+
+def _digest(file_path, block_size=1 << 20):
+    """
+        Returns the blake2b hash of the contents of file_path.
+    """
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
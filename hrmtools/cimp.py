@@ -1,27 +1,66 @@
+import asyncio
+import functools
+import glob
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import pandas as pd
-import PySimpleGUI as sg
+from . import storage, textio, xmlio
+from .store import ChunkedStore, MemmapStore, Store, TextStore
+from .tail import Tail
 
 
 class Import():
     """
         This class handles importing of HRM data. Upon initilization it creates a
         link to the HRM parent object that stores the HRM data.
+
+        Set the cache property to a cache.Cache object to store parsed text
+        files in binary form so re-opening them skips the text parsing.
     """
 
-    def __init__(self, hrm):
+    def __init__(self, hrm, cache=None):
         self.hrm = hrm
+        self.cache = cache
 
-    def from_text(self, file_path):
+    def from_text(self, file_path, dtype=None, geometry=textio.GEOMETRY_3D,
+                  lazy=False):
         """
             This function imports HRM data from a txt file. The path to the txt
             file can be provided by the file_path arugment. If not it will be
             prompted by Windows file dialogue.
 
+            The file is read in a single typed pass. The byte offset of the
+            "Annotations:" row is found first, then the pressure rows are
+            parsed straight into a contiguous numeric array and the annotation
+            rows are parsed separately.
+
             Arguments: 
             ----------
             file_path {string} -- string that points to the txt file to be
             imported
 
+            dtype {string} -- Optional. Numeric type used to store the
+            pressures. Either "float64", "float32" or "int16" (fixed point
+            using the scale property of the data class). Defaults to the
+            storage property of the data class.
+
+            geometry {tuple int} -- Optional. (levels, sectors) of the 3D
+            sensors. Files with 36 + levels * sectors sensor columns are
+            detected as 3D HRM files. The 3D sensors are then stored in the
+            pressures_3d property of the data class as one array of shape
+            (time, level, sector) and the standard 36 sensors remain in the
+            pressures property. Defaults to (16, 8).
+
+            lazy {bool} -- Optional. If true only the header, row count, time
+            span and annotations are read when the file is opened. The
+            pressures are parsed when the pressures property of the data class
+            is first accessed, or only for the requested window when using
+            HRM.get_segment. 3D sensors are not read in this mode. Compressed
+            files cannot be read from arbitrary positions without
+            decompressing everything before them, so they are always read in
+            full. Defaults to False.
+
             Returns: 
             --------
             df_HRM {pandas dataframe} -- dataframe containing all the HRM
@@ -37,67 +76,360 @@ class Import():
         # Check if the file_path was given. If not, use a dialogue window to ask
         # the user for one.
         if not file_path:
+            # Only import the GUI toolkit when the dialogue is needed
+            import PySimpleGUI as sg
             file_path = sg.PopupGetFile("Choose a text file to open",
                                         title="Open",
                                         default_extension=".txt")
 
-        # Create the dtype input argument. The first two
-        # columns must be objects as they contain text appended below the
-        # pressure data in the form of the annotations. Sets all rest of the
-        # columns to floats. Note the column names must be strings.
-        data_dict = {"TIME": "object", "1": "object"}
-        data_dict2 = {str(i): "float" for i in range(2, 37)}
-        data_dict.update(data_dict2)
-
-        # Read the entire csv file into a dataframe.
+        # Read the pressure and annotation blocks of the file. Use the binary
+        # cache if one is set and it holds an up to date copy of the file.
         try:
-            df_full = pd.read_csv(file_path, delimiter="\t",
-                                  dtype=data_dict)
+            dtype, scale = self._storage(dtype)
+            result = _load(file_path, dtype, scale, self.cache, geometry, lazy)
         except Exception as e:
             print(f"{type(e)} The file was not able to be opened.")
             return
 
-        # Rename the time column
-        df_full = df_full.rename(columns={"TIME:": "Time"})
+        # Set the parent properties to the imported dataframes
+        _assign(self.hrm.data, result, dtype, scale)
 
-        # Determine the index of the row in which Annotations: appears.
-        idx_of_ann = df_full[df_full["Time"] == "Annotations:"].index[0]
+    async def from_text_async(self, file_path, dtype=None,
+                              geometry=textio.GEOMETRY_3D, progress=None,
+                              executor=None):
+        """
+            Coroutine that imports a txt file like from_text without blocking
+            the event loop. The file is parsed by a worker thread so several
+            files can be opened concurrently with asyncio.gather. Cancelling
+            the task stops the parse at the next block of rows.
 
-        # Copy out the rows that include Annotation data. Only need TIME and 1
-        # columns.
-        df_ann = df_full.loc[df_full.index > idx_of_ann, ("Time", "1")].copy()
+            Arguments:
+            ----------
+            file_path {string} -- string that points to the txt file to be
+            imported. Unlike from_text no dialogue is shown if it is missing.
 
-        # Rename the second column
-        df_ann = df_ann.rename(columns={"1": "Text"})
+            dtype {string} -- Optional. Numeric type used to store the
+            pressures. Defaults to the storage property of the data class.
 
-        # Convert Time column to float
-        df_ann["Time"] = df_ann["Time"].astype("float")
+            geometry {tuple int} -- Optional. (levels, sectors) of the 3D
+            sensors. See from_text.
 
-        # Convert the Time column to the index for df_ann
-        df_ann = df_ann.set_index("Time", drop=True)
+            progress {function} -- Optional. Called on the event loop as
+            progress(bytes_read, bytes_total, rows_read) while the pressure
+            rows are parsed.
 
-        # Copy out the pressure data from df_full. Copy all rows greater than
-        # the row starting Annotations.
-        df_HRM = df_full.loc[df_full.index < idx_of_ann].copy()
+            executor {concurrent.futures.Executor} -- Optional. Executor to
+            run the parse in. Defaults to the event loop's thread pool.
 
-        # Convert the Time and 1st sensor columns to float
-        df_HRM[["Time", "1"]] = df_HRM[["Time", "1"]].astype("float")
+            Returns:
+            --------
+            data {Data} -- the data class of the HRM parent object holding the
+            imported data.
+        """
 
-        # Convert the Time column to the index for df_HRM
-        df_HRM = df_HRM.set_index("Time", drop=True)
+        if not file_path:
+            raise Exception("file_path must be given.")
 
-        # Convert the column names from strings to integers
-        df_HRM.columns = range(1, 37)
+        dtype, scale = self._storage(dtype)
+        loop = asyncio.get_running_loop()
+        cancel = threading.Event()
 
-        # Set the parent properties to the imported dataframes
-        self.hrm.data.pressures = df_HRM
-        self.hrm.data.annotations = df_ann
+        # Deliver the progress on the event loop thread
+        report = None if progress is None else functools.partial(
+            loop.call_soon_threadsafe, progress)
 
-    def from_xml(self, file_path):
+        load = functools.partial(_load, file_path, dtype, scale, self.cache,
+                                 geometry, progress=report, cancel=cancel)
+        try:
+            result = await loop.run_in_executor(executor, load)
+        except asyncio.CancelledError:
+            # Stop the worker thread as well
+            cancel.set()
+            raise
+
+        _assign(self.hrm.data, result, dtype, scale)
+        return self.hrm.data
+
+    def from_directory(self, path, pattern="*.txt", workers=None,
+                       dtype=None, lazy=False):
         """
-            Function for future use to be able to import from xml files.
-            Currently, only the annotations may be located within an xml file
-            and not the HRM pressure data. Therefore, this is not used often and
-            has not been completed as of yet.
+            Imports every txt file in a directory that matches pattern. The
+            files are parsed in parallel by a pool of worker processes and each
+            one is loaded into its own HRM object. The data of the HRM parent
+            object is not modified.
+
+            Arguments:
+            ----------
+            path {string} -- directory containing the txt files.
+
+            pattern {string} -- Optional. Glob pattern of the files to import.
+            Defaults to "*.txt".
+
+            workers {int} -- Optional. Number of worker processes. Defaults to
+            the number of processors. If 1 the files are imported serially.
+
+            dtype {string} -- Optional. Numeric type used to store the
+            pressures. Either "float64", "float32" or "int16". Defaults to the
+            storage property of the data class.
+
+            lazy {bool} -- Optional. If true the files are only scanned and
+            the pressures are parsed on first use. See from_text. Defaults to
+            False.
+
+            Returns:
+            --------
+            loaded {dict} -- file name mapped to the HRM object holding the
+            imported data.
+
+            errors {dict} -- file name mapped to the exception raised while
+            importing that file.
         """
-        pass
+
+        file_paths = sorted(glob.glob(os.path.join(path, pattern)))
+        loaded, errors = {}, {}
+        dtype, scale = self._storage(dtype)
+
+        def add(file_path, result):
+            # Build a new HRM object of the same type as the parent
+            hrm = type(self.hrm)()
+            _assign(hrm.data, result, dtype, scale)
+            loaded[os.path.basename(file_path)] = hrm
+
+        if workers == 1:
+            for file_path in file_paths:
+                try:
+                    add(file_path, _load(file_path, dtype, scale, self.cache,
+                                         textio.GEOMETRY_3D, lazy))
+                except Exception as e:
+                    errors[os.path.basename(file_path)] = e
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_load, file_path, dtype, scale,
+                                       self.cache, textio.GEOMETRY_3D, lazy):
+                           file_path
+                           for file_path in file_paths}
+                for future in as_completed(futures):
+                    file_path = futures[future]
+                    try:
+                        add(file_path, future.result())
+                    except Exception as e:
+                        errors[os.path.basename(file_path)] = e
+
+        # Return the files in name order regardless of completion order
+        loaded = {name: loaded[name] for name in sorted(loaded)}
+        return loaded, errors
+
+    def _storage(self, dtype):
+        """
+            Returns the numeric type and scale factor used to store imported
+            pressures. Uses the storage policy of the data class if dtype is
+            not given.
+        """
+
+        data = self.hrm.data
+        return storage.check(dtype or data.storage, data.scale)
+
+    def follow(self, file_path, dtype=None, geometry=textio.GEOMETRY_3D):
+        """
+            Follows a txt file that is still being written during a
+            procedure. Returns a tail.Tail object whose poll method appends
+            only the newly written rows to the pressures of the HRM parent
+            object. The rows already in the file are read immediately.
+
+            Arguments:
+            ----------
+            file_path {string} -- string that points to the txt file being
+            written.
+
+            dtype {string} -- Optional. Numeric type used to store the
+            pressures. Defaults to the storage property of the data class.
+
+            geometry {tuple int} -- Optional. (levels, sectors) of the 3D
+            sensors. The 3D sensors of 3D files are stored in the
+            pressures_3d property of the data class as in from_text. Defaults
+            to (16, 8).
+
+            Returns:
+            --------
+            tail {Tail} -- object tracking the read position in the file. Use
+            tail.subscribe to be notified of new rows and tail.run to poll
+            until the recording is finished.
+        """
+
+        dtype, scale = self._storage(dtype)
+        tail = Tail(self.hrm, file_path, dtype, scale, geometry)
+        tail.poll()
+        return tail
+
+    def iter_chunks(self, file_path, chunk_seconds=60, dtype="float64"):
+        """
+            Generator that streams a txt file as fixed duration blocks of
+            pressure data instead of loading the whole recording. Memory use is
+            bounded by the size of one block. Does not modify the data stored
+            in the HRM parent object.
+
+            Arguments:
+            ----------
+            file_path {string} -- string that points to the txt file to be
+            streamed.
+
+            chunk_seconds {float} -- Optional. Duration of each block in
+            seconds. Defaults to 60.
+
+            dtype {string} -- Optional. Numeric type used to store the
+            pressures. Either "float64" (default) or "float32". Integer
+            storage is rejected because the blocks hold pressures in mmHg.
+
+            Yields:
+            -------
+            Z {pandas dataframe} -- pressure data of the block. Same layout as
+            the output of HRM.get_segment for all 36 sensors. Blocks of 3D
+            files also hold the 3D sensors as further columns, they are not
+            split into a (time, level, sector) array.
+
+            ann {pandas dataframe} -- The annotations that fall within the
+            time range of the block.
+        """
+
+        return textio.iter_text(file_path, chunk_seconds, dtype)
+
+    def from_binary(self, file_path):
+        """
+            Opens a file in the hrmtools binary container format written by
+            Data.save_to_binary. Only the chunk index and the annotations are
+            read. HRM.get_segment then reads just the chunks that overlap the
+            requested time range.
+
+            Arguments:
+            ----------
+            file_path {string} -- string that points to the binary file.
+
+            Returns:
+            --------
+            None
+        """
+
+        try:
+            store = ChunkedStore(file_path)
+        except Exception as e:
+            print(f"{type(e)} The file was not able to be opened.")
+            return
+
+        # Set the parent properties to the opened store
+        self.hrm.data.store = store
+        self.hrm.data.annotations = store.annotations
+        self.hrm.data.storage = str(store.dtype)
+        self.hrm.data.scale = store.scale
+
+    def from_memmap(self, file_path):
+        """
+            Opens a memmap file written by Data.to_memmap. The pressures stay
+            in the file and only the segments requested through
+            HRM.get_segment are paged in, so opening does not depend on the
+            length of the recording.
+
+            Arguments:
+            ----------
+            file_path {string} -- string that points to the memmap file.
+
+            Returns:
+            --------
+            None
+        """
+
+        try:
+            store = MemmapStore(file_path)
+        except Exception as e:
+            print(f"{type(e)} The file was not able to be opened.")
+            return
+
+        # Set the parent properties to the opened store
+        self.hrm.data.store = store
+        self.hrm.data.annotations = store.annotations
+        self.hrm.data.storage = str(store.values.dtype)
+        self.hrm.data.scale = store.scale
+
+    def from_xml(self, file_path, tag="Annotation", time_key="Time",
+                 text_key="Text"):
+        """
+            Imports annotations from an xml file. Only the annotations may be
+            located within an xml file and not the HRM pressure data. The file
+            is streamed one element at a time so memory use does not depend on
+            its size. The annotations are merged with any annotations already
+            loaded, dropping exact duplicates.
+
+            Arguments:
+            ----------
+            file_path {string} -- string that points to the xml file to be
+            imported.
+
+            tag {string} -- Optional. Name of the annotation elements.
+            Defaults to "Annotation".
+
+            time_key {string} -- Optional. Name of the attribute or child
+            element holding the time in SS.SS or MM:SS.SS. Defaults to "Time".
+
+            text_key {string} -- Optional. Name of the attribute or child
+            element holding the annotation text. Defaults to "Text".
+
+            Returns:
+            --------
+            None
+        """
+
+        try:
+            df_ann = xmlio.read_annotations(file_path, tag, time_key, text_key)
+        except Exception as e:
+            print(f"{type(e)} The file was not able to be opened.")
+            return
+
+        # Merge with the annotations that are already loaded
+        current = self.hrm.data.annotations
+        if current is not None and len(current):
+            df_ann = pd.concat([current, df_ann])
+            duplicated = df_ann.reset_index().duplicated().to_numpy()
+            df_ann = df_ann[~duplicated]
+        self.hrm.data.annotations = df_ann.sort_index(kind="stable")
+
+
+def _load(file_path, dtype, scale, cache, geometry, lazy=False, progress=None,
+          cancel=None):
+    """
+        Reads a txt file through the cache if one is given. If lazy an
+        uncompressed file is only scanned and a store.TextStore is returned
+        in place of the pressures. Defined at module level so it can be run
+        by worker processes.
+    """
+
+    cached = cache.load(file_path, dtype, scale) if cache else None
+    if cached:
+        return cached
+
+    # Seeking in a compressed file decompresses it from the start, so every
+    # window would cost a pass over the file. Read those in full instead.
+    if lazy and textio.compression(file_path) is None:
+        store = TextStore(file_path, dtype, scale)
+        return store, store.annotations, None
+
+    df_HRM, df_ann, values_3d = textio.read_text(file_path, dtype, scale,
+                                                 geometry, progress, cancel)
+    if cache:
+        cache.store(file_path, df_HRM, df_ann, scale, values_3d)
+    return df_HRM, df_ann, values_3d
+
+
+def _assign(data, result, dtype, scale):
+    """
+        Sets the pressures, or the store holding them, and the annotations
+        returned by _load on a data class.
+    """
+
+    pressures, df_ann, values_3d = result
+    if isinstance(pressures, Store):
+        data.store = pressures
+    else:
+        data.pressures = pressures
+    data.annotations = df_ann
+    data.pressures_3d = values_3d
+    data.storage = str(dtype)
+    data.scale = scale
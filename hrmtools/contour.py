@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+
+def isobar(Z, threshold=20.0, times=None, sensors=None):
+    """
+        Extracts the isobaric contour of threshold from a pressure segment
+        without drawing it. The area at or above threshold is described as
+        runs of consecutive samples per sensor. Runs of neighbouring sensors
+        that overlap in time are connected into numbered regions.
+
+        Arguments:
+        ----------
+        Z {pandas data frame | numpy array} -- pressures (time, sensor) such
+        as the output of HRM.get_segment.
+
+        threshold {float} -- Optional. Isobar in mmHg. Defaults to 20.
+
+        times {numpy array} -- Optional. Time of each row of Z. Taken from the
+        index of a dataframe, otherwise the row number.
+
+        sensors {list int} -- Optional. Sensor of each column of Z. Taken from
+        the columns of a dataframe, otherwise the column number.
+
+        Returns:
+        --------
+        runs {pandas data frame} -- One row per run with the columns Region,
+        Sensor, Start and End. Start is the time of the first sample of the
+        run and End the time of its last sample.
+    """
+
+    if hasattr(Z, "columns"):
+        times = Z.index.values if times is None else times
+        sensors = list(Z.columns) if sensors is None else sensors
+    Z = np.asarray(Z, dtype="float64")
+    times = np.arange(len(Z)) if times is None else np.asarray(times)
+    sensors = np.arange(Z.shape[1]) if sensors is None else np.asarray(sensors)
+
+    column, start, end = runs(Z >= threshold)
+    region = _label(column, start, end)
+
+    return pd.DataFrame({"Region": region,
+                         "Sensor": sensors[column],
+                         "Start": times[start],
+                         "End": times[end - 1]})
+
+
+def runs(mask):
+    """
+        Finds the runs of True values down each column of mask (time, sensor).
+
+        Arguments:
+        ----------
+        mask {numpy array} -- boolean array (time, sensor).
+
+        Returns:
+        --------
+        column {numpy array} -- column of each run.
+
+        start {numpy array} -- first row of each run.
+
+        end {numpy array} -- row after the last row of each run.
+
+        The runs are sorted by column and then by start.
+    """
+
+    padded = np.zeros((mask.shape[1], mask.shape[0] + 2), dtype="int8")
+    padded[:, 1:-1] = mask.T
+    steps = np.diff(padded, axis=1)
+    column, start = np.nonzero(steps == 1)
+    _, end = np.nonzero(steps == -1)
+    return column, start, end
+
+
+def arrival(Z, threshold=30.0, onsets=0):
+    """
+        Sample at which the pressure of each sensor first reaches threshold
+        after the onset of each swallow. This is the front of the isobaric
+        contour.
+
+        Arguments:
+        ----------
+        Z {numpy array} -- pressures (swallow, time, sensor).
+
+        threshold {float} -- Optional. Isobar in mmHg.
+
+        onsets {int | numpy array} -- Optional. Sample of each onset.
+
+        Returns:
+        --------
+        arrival {numpy array} -- samples from the onset to the arrival of
+        shape (swallow, sensor). NaN where the sensor never reaches threshold.
+    """
+
+    onsets = np.asarray(onsets).reshape(-1, 1)
+    before = np.arange(Z.shape[1]) < onsets
+    above = (Z >= threshold) & ~before[:, :, None]
+    reached = above.any(axis=1)
+    return np.where(reached, above.argmax(axis=1) - onsets, np.nan)
+
+
+def break_length(Z, threshold=20.0, spacing=1.0, onsets=0):
+    """
+        Length of the largest break in the isobaric contour of each swallow.
+        A break is a run of neighbouring sensors between the first and last
+        sensor reaching threshold that never reach threshold themselves.
+
+        Arguments:
+        ----------
+        Z {numpy array} -- pressures (swallow, time, sensor) of the distal
+        esophagus.
+
+        threshold {float} -- Optional. Isobar in mmHg. Defaults to 20.
+
+        spacing {float} -- Optional. Distance between sensors in cm.
+
+        onsets {int | numpy array} -- Optional. Sample of each onset.
+
+        Returns:
+        --------
+        length {numpy array} -- break length of each swallow in cm. 0 without
+        a break, NaN if no sensor reaches threshold.
+    """
+
+    reached = ~np.isnan(arrival(Z, threshold, onsets))
+    sensors = reached.shape[1]
+    first = reached.argmax(axis=1)
+    last = sensors - 1 - reached[:, ::-1].argmax(axis=1)
+
+    # Sensors inside the contour that did not reach threshold. Count the
+    # longest run of them in each swallow.
+    inside = np.arange(sensors)
+    gap = ~reached & (inside >= first[:, None]) & (inside <= last[:, None])
+    column, start, end = runs(gap.T)
+    longest = np.zeros(len(reached))
+    np.maximum.at(longest, column, end - start)
+
+    return np.where(reached.any(axis=1), longest * spacing, np.nan)
+
+
+def front_velocity(Z, rate, threshold=30.0, spacing=1.0, onsets=0):
+    """
+        Contractile front velocity. The slope of a least squares line through
+        the arrival of the isobar along the sensors.
+
+        Arguments:
+        ----------
+        Z {numpy array} -- pressures (swallow, time, sensor) of the distal
+        esophagus ordered from proximal to distal.
+
+        rate {float} -- samples per second.
+
+        threshold {float} -- Optional. Isobar in mmHg. Defaults to 30.
+
+        spacing {float} -- Optional. Distance between sensors in cm.
+
+        onsets {int | numpy array} -- Optional. Sample of each onset.
+
+        Returns:
+        --------
+        velocity {numpy array} -- front velocity of each swallow in cm/s.
+        NaN if fewer than two sensors reach threshold or the front does not
+        move.
+    """
+
+    times = arrival(Z, threshold, onsets) / rate
+    position = np.arange(Z.shape[2]) * spacing
+    valid = ~np.isnan(times)
+    count = valid.sum(axis=1)
+
+    # Least squares slope of position over time using the reached sensors
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_mean = np.nansum(times, axis=1) / count
+        x_mean = (valid * position).sum(axis=1) / count
+        dt = np.where(valid, times - t_mean[:, None], 0.0)
+        dx = np.where(valid, position - x_mean[:, None], 0.0)
+        velocity = (dt * dx).sum(axis=1) / (dt * dt).sum(axis=1)
+
+    return np.where((count >= 2) & np.isfinite(velocity), velocity, np.nan)
+
+
+def _label(column, start, end):
+    """
+        Numbers the connected regions of runs. Runs of neighbouring columns
+        are connected if they overlap.
+    """
+
+    count = len(column)
+    if not count:
+        return np.empty(0, dtype="int64")
+
+    # Pair each run with the overlapping runs of the next column. Runs of one
+    # column are sorted and do not overlap, so the overlapping runs of the
+    # next column are a contiguous range found by binary search.
+    # Runs are keyed by column * span + row so all keys are sorted and the
+    # next column is span further on.
+    span = int(end.max()) + 1
+    key_start = column * span + start
+    key_end = column * span + end
+    low = np.searchsorted(key_end, key_start + span, side="right")
+    high = np.searchsorted(key_start, key_end + span, side="left")
+    repeats = np.maximum(high - low, 0)
+    first = np.repeat(np.arange(count), repeats)
+    second = (np.repeat(low - np.cumsum(repeats) + repeats, repeats)
+              + np.arange(repeats.sum()))
+
+    # Propagate the smallest run number through the connections
+    labels = np.arange(count)
+    while True:
+        smallest = np.minimum(labels[first], labels[second])
+        new = labels.copy()
+        np.minimum.at(new, first, smallest)
+        np.minimum.at(new, second, smallest)
+        new = new[new]
+        if np.array_equal(new, labels):
+            break
+        labels = new
+
+    # Number the regions 1, 2, ... in order of their first run
+    _, region = np.unique(labels, return_inverse=True)
+    return region + 1
@@ -1,27 +1,28 @@
+from functools import lru_cache
+import numpy as np
+
+
 def time_in_sec(input_time):
     """
         Converts input_time from format MM:SS.SS to SS.SS
 
-        Arguments: 
-        input_time {string} or {list of string} -- string(s) with time
-        given in MM:SS.SS
+        Arguments:
+        input_time {string | float} or {list | numpy array | pandas series}
+        -- time(s) given in MM:SS.SS or already in SS.SS
 
-        Returns: 
-        seconds {float} or {list of float} -- converted time in SS.SS
+        Returns:
+        seconds {float} or {list of float | numpy array} -- converted time in
+        SS.SS. Lists and tuples give a list, arrays and series give a numpy
+        array.
     """
 
-    # Initialize output seconds
-    seconds = []
-
-    # Check if input_time was a string or a list of strings
-    if isinstance(input_time, str):
-        for t in input_time:
-            seconds.append(sum(float(x) * 60 ** i for i, x in enumerate(reversed(t.split(':')))))
-    elif isinstance(input_time, (list, tuple)):
-        # Loop through the list or tuple.
-        for time in input_time:
-            seconds.append(_convert_to_sec(time))
+    # A single string or number
+    if isinstance(input_time, (str, bytes)) or np.ndim(input_time) == 0:
+        return _convert_to_sec(input_time)
 
+    seconds = seconds_array(input_time)
+    if isinstance(input_time, (list, tuple)):
+        return seconds.tolist()
     return seconds
 
 
@@ -29,27 +30,67 @@ def time_in_min(input_time):
     """
         Converts input_time from format SS.SS to MM:SS.S
 
-        Arguments: 
-        input_time {float} or {list of float} -- float(s) with time
-        given in SS.SS
+        Arguments:
+        input_time {float} or {list of float | numpy array | pandas series}
+        -- float(s) with time given in SS.SS
+
+        Returns:
+        string {string} or {list of strings | numpy array} -- converted time
+        in MM:SS.S. Arrays and series give a numpy array of strings, other
+        iterables a list.
+    """
+
+    # A single number
+    if np.ndim(input_time) == 0 and not isinstance(input_time, str):
+        return _convert_to_min(input_time)
+
+    strings = minutes_array(input_time)
+    if isinstance(input_time, np.ndarray) or hasattr(input_time, "dtype"):
+        return strings
+    return strings.tolist()
 
-        Returns: 
-        string {string} or {list of strings} -- converted time in MM:SS.S
+
+def seconds_array(input_time):
+    """
+        Converts a whole array of times in MM:SS.SS or SS.SS to seconds at
+        once. Numeric arrays are only cast to float. For strings each distinct
+        value is parsed once and the results are broadcast back to the array.
+
+        Arguments:
+        input_time {iter string | iter float} -- times to convert.
+
+        Returns:
+        seconds {numpy array} -- converted times in SS.SS.
     """
 
-    # Initialize output seconds
-    string = []
+    values = np.asarray(input_time)
+    if values.dtype.kind in "biuf":
+        return values.astype("float64")
 
-    # Check if input_time was a string or a list of strings
-    if isinstance(input_time, float):
-        string = _convert_to_min(input_time)
-    else:
-        input_time = list(input_time)
-        # Loop through the list of strings
-        for time in input_time:
-            string.append(_convert_to_min(time))
+    # Parse each distinct string once
+    unique, inverse = np.unique(values.astype(str), return_inverse=True)
+    parsed = np.array([_parse(value) for value in unique.tolist()],
+                      dtype="float64")
+    return parsed[inverse].reshape(values.shape)
 
-    return string
+
+def minutes_array(input_time):
+    """
+        Converts a whole array of times in SS.SS to MM:SS.S strings at once.
+        Each distinct time is formatted once.
+
+        Arguments:
+        input_time {iter float} -- times to convert.
+
+        Returns:
+        string {numpy array} -- converted times in MM:SS.S.
+    """
+
+    values = np.asarray(input_time, dtype="float64")
+    unique, inverse = np.unique(values, return_inverse=True)
+    formatted = np.array([_format(value) for value in unique.tolist()],
+                         dtype=object)
+    return formatted[inverse].reshape(values.shape)
 
 
 def _convert_to_sec(input_time):
@@ -58,24 +99,21 @@ def _convert_to_sec(input_time):
         MM:SS.SS to SS.SS. If already in SS.SS will return a float in SS.SS
         format.
 
-        Arguments: 
-        input_time {string} -- string in the form of MM:SS.SS
+        Arguments:
+        input_time {string | float} -- string in the form of MM:SS.SS or a
+        number in SS.SS
 
-        Returns: 
+        Returns:
         seconds {float} -- converted MM to seconds and added to remainder
         seconds
     """
 
-    # Check to see if a colon (":") was contained in input_time
-    if isinstance(input_time, str) and ":" in input_time:
-        # Split the string at the colon
-        mins, secs = input_time.split(":")
-        seconds = float(mins) * 60 + float(secs)
-    else:
-        # time is less than 1 minute
-        seconds = float(input_time)
-
-    return seconds
+    if isinstance(input_time, bytes):
+        input_time = input_time.decode()
+    if isinstance(input_time, str):
+        return _parse(input_time)
+    # time is already a number of seconds
+    return float(input_time)
 
 
 def _convert_to_min(input_time):
@@ -83,18 +121,41 @@ def _convert_to_min(input_time):
         This function takes the input_time as a singular float number and
         converts it from SS.SS to MM:SS.S
 
-        Arguments: 
-        input_time {float} -- float in the form of SS.SS
+        Arguments:
+        input_time {float} -- float in the form of SS.SS. Python and numpy
+        numbers are accepted.
 
-        Returns: 
+        Returns:
         string {string} -- string converted to MM:SS.S
     """
 
-    # Check to see if input_time was a float
-    if isinstance(input_time, float):
-        # Convert to int first to remove decimal, then to string
-        mins = str(int(input_time / 60))
-        sec = str(round(input_time % 60, 2))
-        string = mins + ":" + sec
+    # Check to see if input_time is a number
+    if not isinstance(input_time, (int, float, np.integer, np.floating)):
+        raise Exception(f"Cannot convert {input_time!r} to MM:SS.S.")
+
+    return _format(float(input_time))
+
+
+@lru_cache(maxsize=4096)
+def _parse(input_time):
+    """
+        Parses a time string in SS.SS, MM:SS.SS or HH:MM:SS.SS to seconds.
+        Results are memoized because the same strings repeat in annotation
+        tables and tick labels.
+    """
+
+    # Each part separated by a colon is worth 60 times the next
+    parts = input_time.strip().split(":")
+    return float(sum(float(x) * 60 ** i for i, x in enumerate(reversed(parts))))
+
+
+@lru_cache(maxsize=4096)
+def _format(input_time):
+    """
+        Formats seconds as MM:SS.S. Results are memoized.
+    """
 
-    return string
+    # Convert to int first to remove decimal, then to string
+    mins = str(int(input_time / 60))
+    sec = str(round(input_time % 60, 2))
+    return mins + ":" + sec
@@ -1,12 +1,275 @@
+from itertools import count
+import warnings
+import numpy as np
+import pandas as pd
+from .annindex import AnnotationIndex
+from .store import ChunkedStore, MemmapStore
+from . import storage, textio
+
+
+# Ways of bringing the windows of Data.segments to a common length
+ALIGN = ("pad", "truncate", "resample")
+
+# Reductions of Data.resample
+RESAMPLE = ("mean", "min", "max", "minmax")
+
+# Versions are shared by all Data objects so a new object never repeats the
+# version of the one it replaces
+_versions = count(1)
+
+
 class Data():
     """
         This class serves as a storage object for HRM data. 
+
+        The pressures are either held in memory as a dataframe or, when the
+        store property is set, by an out of core backend such as a
+        store.MemmapStore. With a store only the segments requested through
+        HRM.get_segment are read. Accessing the pressures property reads the
+        entire store into a dataframe.
+
+        The storage property selects how imported pressures are held:
+        "float64", "float32" or "int16". With "int16" the pressures are fixed
+        point integers in units of the scale property (mmHg) and are only
+        converted back to float for the segments that are requested.
+
+        Files from 3D HRM catheters additionally fill the pressures_3d property
+        with a single array of shape (time, level, sector) that shares the
+        time index of the pressures. Replacing the pressures or the store
+        drops the 3D pressures.
+
+        The version property changes whenever the pressures, the store or the
+        annotations are replaced. Versions are unique across all Data objects.
+        Changes made in place, such as assigning to pressures.iloc or
+        annotations.loc, are not detected. Call modified after them so cached
+        segments, the annotation index and the annotation rows are dropped.
     """
 
-    def __init__(self, hrm):
+    def __init__(self, hrm, storage="float64", scale=None):
         self.hrm = hrm
-        self.pressures = None
-        self.annotations = None
+        self._store = None
+        self._pressures = None
+        self._annotations = None
+        self._ann_index = None
+        # True if the annotation index was changed after the annotation
+        # dataframe was built
+        self._ann_stale = False
+        self._ann_rows = None
+        self.version = next(_versions)
+        self._pressures_3d = None
+        self.storage = storage
+        self.scale = scale
+
+    @property
+    def pressures(self):
+        """
+            Gets the pressure dataframe. If the pressures are held by a store
+            they are read into a dataframe on first access.
+        """
+
+        if self._from_store:
+            self._pressures = self.store.to_frame()
+        return self._pressures
+
+    @pressures.setter
+    def pressures(self, pressures):
+        """
+            Sets the pressure dataframe. Replaces any store and drops the 3D
+            pressures, which belong to the old time index.
+        """
+
+        self._pressures = pressures
+        self._store = None
+        self._pressures_3d = None
+        self._changed()
+
+    @property
+    def pressures_3d(self):
+        """
+            Gets the 3D sensor pressures of shape (time, level, sector) or
+            None if no 3D data has been loaded.
+        """
+        return self._pressures_3d
+
+    @pressures_3d.setter
+    def pressures_3d(self, pressures_3d):
+        """
+            Sets the 3D sensor pressures. Must share the time index of the
+            pressures.
+        """
+
+        self._pressures_3d = pressures_3d
+        self._changed()
+
+    @property
+    def _from_store(self):
+        """
+            True if the pressures are read from the store because they have
+            not been loaded into a dataframe.
+        """
+        return self._pressures is None and self._store is not None
+
+    @property
+    def store(self):
+        """
+            Gets the backend holding the pressures outside of a dataframe or
+            None if the pressures are held in memory.
+        """
+        return self._store
+
+    @store.setter
+    def store(self, store):
+        """
+            Sets the backend holding the pressures. Replaces any pressure
+            dataframe and drops the 3D pressures.
+        """
+
+        self._store = store
+        self._pressures = None
+        self._pressures_3d = None
+        self._changed()
+
+    @property
+    def annotations(self):
+        """
+            Gets the annotation dataframe. Rebuilt from the annotation index
+            if annotations were inserted or deleted through the index.
+        """
+
+        if self._ann_stale:
+            self._annotations = self._ann_index.to_frame()
+            self._ann_stale = False
+        return self._annotations
+
+    @annotations.setter
+    def annotations(self, annotations):
+        """
+            Sets the annotation dataframe. Replaces the annotation index.
+        """
+
+        self._annotations = annotations
+        self._ann_index = None
+        self._ann_stale = False
+        self._changed()
+
+    @property
+    def annotation_index(self):
+        """
+            Gets the annotation index (annindex.AnnotationIndex) used for range
+            and text queries. Built from the annotation dataframe on first
+            access. Annotations inserted or deleted through the index are
+            reflected in the annotations property.
+        """
+
+        if self._ann_index is None:
+            self._ann_index = AnnotationIndex.from_frame(
+                self._annotations, on_change=self._index_changed)
+        return self._ann_index
+
+    def modified(self):
+        """
+            Marks the pressures or annotations as changed in place. Gives the
+            data a new version and drops values derived from the data.
+        """
+
+        self._changed()
+        if not self._ann_stale:
+            self._ann_index = None
+
+    def _changed(self):
+        """
+            Gives the data a new version and drops the annotation rows.
+        """
+
+        self.version = next(_versions)
+        self._ann_rows = None
+
+    def _index_changed(self):
+        """
+            Called by the annotation index after an insert or delete.
+        """
+
+        self._ann_stale = True
+        self._changed()
+
+    @property
+    def annotation_rows(self):
+        """
+            Row of the pressure data at or directly after each annotation. -1
+            marks annotations after the last sample. Computed once per set of
+            pressures and annotations.
+        """
+
+        if self._ann_rows is None:
+            if self.empty or self.annotations is None:
+                return np.empty(0, dtype="int64")
+            times = self.times
+            rows = np.searchsorted(times, self.annotations.index.values)
+            rows[rows >= len(times)] = -1
+            self._ann_rows = rows
+        return self._ann_rows
+
+    @property
+    def times(self):
+        """
+            Time stamps of all samples in SS.SS.
+        """
+
+        if self._from_store:
+            return self.store.times
+        return self._pressures.index.values
+
+    @property
+    def sample_rate(self):
+        """
+            Mean number of samples per second or None if fewer than two
+            samples have been loaded.
+        """
+
+        times = self.times if not self.empty else ()
+        if len(times) < 2 or times[-1] <= times[0]:
+            return None
+        return (len(times) - 1) / float(times[-1] - times[0])
+
+    @property
+    def empty(self):
+        """
+            True if no pressure data has been loaded.
+        """
+
+        if self._from_store:
+            return self.store.empty
+        return getattr(self._pressures, "empty", True)
+
+    @property
+    def shape(self):
+        """
+            Shape of the pressure data (time, sensors) or None if no pressure
+            data has been loaded.
+        """
+
+        if self._from_store:
+            return self.store.shape
+        return getattr(self._pressures, "shape", None)
+
+    @property
+    def time_span(self):
+        """
+            Time stamps (first, last) of the pressure data in SS.SS or None if
+            no pressure data has been loaded. Does not read the pressures of a
+            store.
+        """
+
+        if self.empty:
+            return None
+        if self._from_store:
+            span = getattr(self.store, "time_span", None)
+            if span is not None:
+                return span
+            times = self.store.times
+        else:
+            times = self._pressures.index.values
+        return float(times[0]), float(times[-1])
 
     def __repr__(self):
         """
@@ -14,9 +277,9 @@ class Data():
             dataframe and the number of annotations stored.
         """
 
-        if not getattr(self.pressures, "empty", True):
+        if not self.empty:
             # Retrieve the shape of the dataframe
-            shape_p = self.pressures.shape
+            shape_p = self.shape
         else:
             shape_p = None
         if not getattr(self.annotations, "empty", True):
@@ -28,18 +291,561 @@ class Data():
         # Build the expression to return
         expression = (f"Data(pressures=pandas.dataframe of shape {shape_p}, "
                       + f"annotations=pandas.dataframe of shape {shape_a})")
+        if self.pressures_3d is not None:
+            expression = (expression[:-1] + ", pressures_3d=numpy.ndarray of "
+                          + f"shape {self.pressures_3d.shape})")
         return expression
 
-    def save_to_text(self, save_path):
+    def segment(self, time_start, time_end, sensors):
+        """
+            Returns the pressures of sensors within time_start <= time <
+            time_end. Reads from the store if the pressures have not been
+            loaded into a dataframe.
+
+            Arguments:
+            ----------
+            time_start {float} -- start of the segment in SS.SS.
+
+            time_end {float} -- end of the segment in SS.SS.
+
+            sensors {list int} -- The sensors to include.
+
+            Returns:
+            --------
+            Z {pandas data frame} -- Segment of the pressure data.
+        """
+
+        if self._from_store:
+            Z = self.store.segment(time_start, time_end, sensors)
+        else:
+            p = self._pressures
+            first, last = _locate(p.index, time_start, time_end)
+            if first is None:
+                # Unsorted time index. Fall back to a full scan.
+                mask = (p.index >= time_start) & (p.index < time_end)
+                Z = p.loc[mask, sensors]
+            elif list(sensors) == list(p.columns):
+                # All sensors in stored order. Return a view of the rows.
+                Z = p.iloc[first:last]
+            else:
+                positions = p.columns.get_indexer(sensors)
+                if (positions < 0).any():
+                    raise KeyError(f"Sensors {list(sensors)} are not stored.")
+                Z = p.iloc[first:last, positions]
+
+        # Convert fixed point pressures back to float for this segment only
+        return storage.decode(Z, self.scale)
+
+    def annotation_segment(self, time_start, time_end):
+        """
+            Returns the annotations within time_start <= time < time_end.
+
+            Arguments:
+            ----------
+            time_start {float} -- start of the segment in SS.SS.
+
+            time_end {float} -- end of the segment in SS.SS.
+
+            Returns:
+            --------
+            ann {pandas data frame} -- The annotations within the segment.
+        """
+
+        a = self.annotations
+        first, last = _locate(a.index, time_start, time_end)
+        if first is None:
+            return a.loc[(a.index >= time_start) & (a.index < time_end)]
+        return a.iloc[first:last]
+
+    def segments(self, starts, ends, sensors, align="pad", samples=None):
+        """
+            Returns the pressures of sensors for many time windows at once as
+            a single array. The windows are located with one binary search
+            over the time index and gathered with one indexing operation.
+            Windows of a store are read one after another.
+
+            Arguments:
+            ----------
+            starts {iter float} -- start of each window in SS.SS.
+
+            ends {iter float} -- end of each window in SS.SS.
+
+            sensors {list int} -- The sensors to include.
+
+            align {string} -- Optional. How windows of different length are
+            brought to a common number of samples. "pad" fills the end of
+            shorter windows with NaN, "truncate" cuts all windows to the
+            shortest and "resample" linearly interpolates every window onto
+            an evenly spaced grid from its start to its end.
+
+            samples {int} -- Optional. Number of samples per window. Defaults
+            to the longest window for "pad" and "resample" and to the shortest
+            window for "truncate".
+
+            Returns:
+            --------
+            Z {numpy array} -- pressures of shape (window, sample, sensor).
+
+            times {numpy array} -- time stamps of shape (window, sample). NaN
+            where a window was padded.
+        """
+
+        if align not in ALIGN:
+            raise Exception(f"align must be one of {ALIGN}.")
+
+        starts = np.asarray(starts, dtype="float64").ravel()
+        ends = np.asarray(ends, dtype="float64").ravel()
+        if len(starts) != len(ends):
+            raise Exception("starts and ends must have the same length.")
+
+        if self._from_store:
+            # Read each window and lay them out one after another so they can
+            # be gathered like the rows of a dataframe.
+            parts = [self.store.segment(start, end, sensors)
+                     for start, end in zip(starts, ends)]
+            lengths = np.array([len(part) for part in parts], dtype="int64")
+            firsts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            times = np.concatenate(
+                [np.empty(0)] + [part.index.values for part in parts])
+            values = np.concatenate(
+                [np.empty((0, len(sensors)))]
+                + [storage.decode(part.to_numpy(), self.scale)
+                   for part in parts])
+            positions = np.arange(len(sensors))
+        else:
+            p = self._pressures
+            if not p.index.is_monotonic_increasing:
+                p = p.sort_index(kind="stable")
+            times, values = p.index.values, p.to_numpy()
+            firsts = np.searchsorted(times, starts)
+            lengths = np.searchsorted(times, ends) - firsts
+            positions = p.columns.get_indexer(sensors)
+            if (positions < 0).any():
+                raise KeyError(f"Sensors {list(sensors)} are not stored.")
+
+        if samples is None:
+            if not len(lengths):
+                samples = 0
+            elif align == "truncate":
+                samples = int(lengths.min())
+            else:
+                samples = int(lengths.max())
+
+        if align == "resample":
+            step = (ends - starts) / max(samples, 1)
+            grid = starts[:, None] + step[:, None] * np.arange(samples)
+            if self._from_store:
+                # The windows read from a store are not sorted as a whole.
+                # Search each window on its own.
+                rows = np.array([first + np.searchsorted(
+                    times[first:first + length], stamps, side="right") - 1
+                    for first, length, stamps in zip(firsts, lengths, grid)],
+                    dtype="int64").reshape(grid.shape)
+            else:
+                rows = np.searchsorted(times, grid, side="right") - 1
+            Z = _interpolate(times, values, rows, firsts, lengths, positions,
+                             grid, self.scale)
+            return Z, grid
+
+        # Row of each sample within times. Samples past the end of a window
+        # point at row 0 and are replaced with NaN afterwards.
+        if not len(times):
+            return (np.full((len(starts), samples, len(positions)), np.nan),
+                    np.full((len(starts), samples), np.nan))
+        offsets = np.arange(samples)
+        valid = offsets < lengths[:, None]
+        rows = np.where(valid, firsts[:, None] + offsets, 0)
+
+        Z = _gather(values, rows, positions, self.scale)
+        seg_times = times[rows].astype("float64")
+        Z[~valid] = np.nan
+        seg_times[~valid] = np.nan
+
+        return Z, seg_times
+
+    def annotation_segments(self, starts, ends):
+        """
+            Returns the annotations within each of many time windows.
+
+            Arguments:
+            ----------
+            starts {iter float} -- start of each window in SS.SS.
+
+            ends {iter float} -- end of each window in SS.SS.
+
+            Returns:
+            --------
+            anns {list pandas data frame} -- The annotations of each window.
+        """
+
+        a = self.annotations
+        if not a.index.is_monotonic_increasing:
+            a = a.sort_index(kind="stable")
+        firsts = np.searchsorted(a.index.values, starts)
+        lasts = np.searchsorted(a.index.values, ends)
+        return [a.iloc[first:last] for first, last in zip(firsts, lasts)]
+
+    def epochs(self, text, pre, post, sensors, regex=False):
+        """
+            Returns the pressures of sensors around every annotation whose
+            text matches. All epochs share the same number of samples and are
+            gathered into one array using the precomputed row of each
+            annotation.
+
+            Arguments:
+            ----------
+            text {string} -- annotation text to match. Matched exactly after
+            stripping whitespace unless regex is True.
+
+            pre {float} -- seconds before each annotation.
+
+            post {float} -- seconds after each annotation.
+
+            sensors {list int} -- The sensors to include.
+
+            regex {bool} -- Optional. Match text as a regular expression
+            against the whole annotation text.
+
+            Returns:
+            --------
+            Z {numpy array} -- pressures of shape (epoch, sample, sensor). NaN
+            where an epoch reaches past the start or end of the recording.
+
+            offsets {numpy array} -- time of each sample relative to the
+            annotation in seconds.
+
+            events {pandas data frame} -- the matching annotations indexed by
+            time with their Text and the Row of the annotation sample.
+        """
+
+        if self.empty:
+            raise Exception("No data has been loaded yet. Cannot segment.")
+
+        if regex:
+            texts = self.annotations["Text"].fillna("").astype(str).str.strip()
+            match = texts.str.fullmatch(text).to_numpy(dtype=bool)
+            rows = self.annotation_rows
+            match = match & (rows >= 0)
+            events = self.annotations.loc[match].copy()
+            anchors = rows[match]
+        else:
+            # Look the times up in the inverted index of the annotation texts
+            ann_times = np.array(self.annotation_index.find(text))
+            anchors = np.searchsorted(self.times, ann_times)
+            match = anchors < self.shape[0]
+            index = pd.Index(ann_times[match], name="Time")
+            events = pd.DataFrame({"Text": pd.Series(
+                [str(text).strip()] * len(index), index=index,
+                dtype="object")})
+            anchors = anchors[match]
+        events["Row"] = anchors
+
+        # Samples before and after each annotation at the recording rate
+        rate = self.sample_rate or 1.0
+        before, after = int(round(pre * rate)), int(round(post * rate))
+        offsets = np.arange(-before, after)
+        rows = anchors[:, None] + offsets
+        valid = (rows >= 0) & (rows < self.shape[0])
+
+        if self._from_store:
+            positions = self.store.positions(sensors)
+            Z = np.full(rows.shape + (len(positions),), np.nan)
+            for idx, anchor in enumerate(anchors):
+                # Read the rows of each epoch that lie within the recording
+                first = anchor - before
+                low, high = max(first, 0), min(anchor + after, self.shape[0])
+                if low < high:
+                    _, values = self.store._read(low, high, positions)
+                    Z[idx, low - first:high - first] = storage.decode(
+                        values, self.scale)
+        else:
+            p = self._pressures
+            positions = p.columns.get_indexer(sensors)
+            if (positions < 0).any():
+                raise KeyError(f"Sensors {list(sensors)} are not stored.")
+            rows = np.where(valid, rows, 0)
+            Z = _gather(p.to_numpy(), rows, positions, self.scale)
+            Z[~valid] = np.nan
+
+        return Z, offsets / rate, events
+
+    def segment_3d(self, time_start, time_end):
+        """
+            Returns the 3D sensor pressures within time_start <= time <
+            time_end.
+
+            Arguments:
+            ----------
+            time_start {float} -- start of the segment in SS.SS.
+
+            time_end {float} -- end of the segment in SS.SS.
+
+            Returns:
+            --------
+            Z {numpy array} -- pressures of shape (time, level, sector).
+
+            times {numpy array} -- time stamps of the segment.
+        """
+
+        if self.pressures_3d is None:
+            raise Exception("No 3D data has been loaded. Cannot segment.")
+
+        times = self.times
+        first, last = np.searchsorted(times, (time_start, time_end))
+        Z = storage.decode(self.pressures_3d[first:last], self.scale)
+        return Z, times[first:last]
+
+    def resample(self, rate, method="mean", hrm=None):
+        """
+            Returns a new Data object with the pressures reduced to a lower
+            sample rate. Consecutive samples are grouped into blocks of
+            (sample_rate / rate) rows and each block is reduced with one
+            reshaped array operation. The recording is processed in groups of
+            blocks so pressures held in a store are never fully loaded.
+
+            Arguments:
+            ----------
+            rate {float} -- new samples per second. Rounded so each block
+            holds a whole number of samples.
+
+            method {string} -- Optional. "mean", "min", "max" or "minmax".
+            "minmax" keeps the minimum and the maximum of each block as two
+            samples, at the start and the middle of the block, so peaks are
+            preserved when plotting.
+
+            hrm {HRM} -- Optional. HRM object the new Data object belongs to.
+            Defaults to the HRM object of this one.
+
+            Returns:
+            --------
+            data {Data} -- resampled data with the same storage type, the same
+            sensors and a copy of the annotations.
+        """
+
+        if method not in RESAMPLE:
+            raise Exception(f"method must be one of {RESAMPLE}.")
+        if self.empty:
+            raise Exception("No data has been loaded yet. Cannot resample.")
+
+        source = self.sample_rate or float(rate)
+        factor = int(round(source / float(rate)))
+        if factor < 1:
+            raise Exception(f"rate must not be above the sample rate of "
+                            f"{source:g} Hz.")
+
+        # Whole blocks per group so each group reduces independently
+        group = factor * max(1, (1 << 16) // factor)
+        times, values = [], []
+        for block_times, block_values in self.blocks(group):
+            dtype = block_values.dtype
+            block_times, block_values = _reduce(block_times, block_values,
+                                                factor, method)
+            times.append(block_times)
+            values.append(block_values)
+        times = np.concatenate(times)
+        values = _restore(np.concatenate(values), dtype)
+
+        data = Data(hrm or self.hrm, self.storage, self.scale)
+        data.pressures = textio.frame(times, values, ["Time"] + self.columns)
+        if self.annotations is not None:
+            data.annotations = self.annotations.copy()
+        if self.pressures_3d is not None:
+            _, values_3d = _reduce(self.times, self.pressures_3d, factor,
+                                   method)
+            data.pressures_3d = _restore(values_3d, self.pressures_3d.dtype)
+        return data
+
+    def set_storage(self, storage_type, scale=None):
+        """
+            Changes the numeric type the pressures are stored as and converts
+            the loaded pressures. The storage is also applied to later imports.
+
+            Arguments:
+            ----------
+            storage_type {string} -- "float64", "float32" or "int16".
+
+            scale {float} -- Optional. Scale factor in mmHg of "int16" storage.
+            Defaults to 0.1.
+
+            Returns:
+            --------
+            None
+        """
+
+        dtype, scale = storage.check(storage_type, scale)
+        # Setting the pressures drops the 3D pressures. Keep them to convert.
+        values_3d = self.pressures_3d
+        if not self.empty:
+            p = self.pressures
+            values = storage.convert(p.to_numpy(), self.scale, dtype, scale)
+            self.pressures = p.__class__(values, index=p.index,
+                                         columns=p.columns, copy=False)
+        if values_3d is not None:
+            self.pressures_3d = storage.convert(values_3d, self.scale, dtype,
+                                                scale)
+        self.storage = str(dtype)
+        self.scale = scale
+        self._changed()
+
+    def to_memmap(self, path):
+        """
+            Moves the pressures into a memory-mapped file and replaces the
+            dataframe with a store.MemmapStore backed by that file. The file
+            can be opened by other processes with Import.from_memmap.
+
+            Arguments:
+            ----------
+            path {string} -- location of the new memmap file.
+
+            Returns:
+            --------
+            store {MemmapStore} -- the store now holding the pressures.
+        """
+
+        if self.empty:
+            raise Exception("No data has been loaded yet. Cannot save.")
+        if self.pressures_3d is not None:
+            warnings.warn("Memmap files do not hold 3D pressures. The 3D "
+                          "pressures stay in memory but are not written to "
+                          f"{path}.", stacklevel=2)
+
+        store = MemmapStore.create(path, self.pressures, self.annotations,
+                                   self.scale)
+        # The 3D pressures share the time index and stay in memory
+        values_3d = self.pressures_3d
+        self.store = store
+        self._pressures_3d = values_3d
+        return store
+
+    def blocks(self, rows=1 << 16):
+        """
+            Generator over the stored pressures in blocks of consecutive rows.
+            Reads from the store if the pressures have not been loaded into a
+            dataframe. Integer pressures are returned as stored.
+
+            Arguments:
+            ----------
+            rows {int} -- Optional. Maximum number of rows per block.
+
+            Yields:
+            -------
+            times {numpy array} -- time stamps of the block.
+
+            values {numpy array} -- pressures of the block (time, sensors).
+        """
+
+        if self._from_store:
+            store = self.store
+            positions = list(range(len(store.columns)))
+            for first in range(0, store.rows, rows):
+                yield store._read(first, min(first + rows, store.rows),
+                                  positions)
+        else:
+            p = self._pressures
+            times, values = p.index.values, p.to_numpy()
+            for first in range(0, len(times), rows):
+                yield times[first:first + rows], values[first:first + rows]
+
+    def _blocks_3d(self, rows=1 << 16):
+        """
+            Generator like blocks with the 3D pressures of each block appended
+            after the standard sensors, one column per level and sector.
+        """
+
+        first = 0
+        for times, values in self.blocks(rows):
+            count = len(times)
+            values_3d = self.pressures_3d[first:first + count]
+            yield times, np.concatenate(
+                (values, values_3d.reshape(count, -1)), axis=1)
+            first += count
+
+    def _columns_3d(self):
+        """
+            Sensor numbers of the standard sensors followed by the numbers of
+            the 3D sensors in the column order of a 3D HRM export.
+        """
+
+        columns = self.columns
+        count = int(np.prod(self.pressures_3d.shape[1:]))
+        return columns + list(range(len(columns) + 1,
+                                    len(columns) + count + 1))
+
+    @property
+    def columns(self):
+        """
+            Sensor numbers of the stored pressures.
+        """
+
+        if self._from_store:
+            return list(self.store.columns)
+        return list(self._pressures.columns)
+
+    def save_to_binary(self, save_path, chunk_seconds=10, metadata=None):
+        """
+            Saves the data in the hrmtools binary container format. The
+            pressures are stored in chunks of chunk_seconds with an index so
+            segments can later be read without loading the whole file. Open
+            the file with Import.from_binary. The 3D pressures are not
+            stored, use save_to_text to keep them.
+
+            Arguments:
+            ----------
+            save_path {string} -- location of the new file including name.
+
+            chunk_seconds {float} -- Optional. Duration of each chunk in
+            seconds. Defaults to 10.
+
+            metadata {dict} -- Optional. JSON serializable information to store
+            with the recording.
+
+            Returns:
+            --------
+            success {bool} -- whether or not the save operation completed
+            successfully
+        """
+
+        if self.pressures_3d is not None:
+            warnings.warn("The binary format does not hold 3D pressures. "
+                          "Only the standard sensors are saved to "
+                          f"{save_path}.", stacklevel=2)
+
+        try:
+            ChunkedStore.create(save_path, self.blocks(), self.columns,
+                                self.annotations, self.scale, chunk_seconds,
+                                metadata)
+        except Exception as e:
+            print(f"{type(e)} Was not able to save the data as a binary file.")
+            success = False
+            return success
+        else:
+            success = True
+            return success
+
+    def save_to_text(self, save_path, compression="infer", precision=2,
+                     time_precision=2):
         """
             Saves the data currently stored in data class property and
-            in a new text file.
+            in a new text file. The file can be imported again with
+            Import.from_text. 3D pressures are written after the standard
+            sensors in the column layout of a 3D HRM export.
 
             Arguments:
             ----------
             save_path {string} -- location of the new text file including
             name.
 
+            compression {string | None} -- Optional. "gzip", "bz2", "xz" or
+            None. Defaults to "infer" which selects the compression from the
+            extension of save_path (.gz, .bz2, .xz). The file is compressed
+            while it is written.
+
+            precision {int} -- Optional. Number of decimals written for the
+            pressures. Defaults to 2.
+
+            time_precision {int} -- Optional. Number of decimals written for
+            the time stamps. Defaults to 2.
+
             Returns:
             --------
             success {bool} -- whether or not the save operation completed
@@ -47,26 +853,15 @@ class Data():
         """
 
         try:
-            # Save the HRM pressure data first text file.
-            self.pressures.to_csv(save_path,
-                                  header=True,
-                                  index=False,
-                                  sep="\t",
-                                  mode="w")
-
-            # Append Annotations: to the text file.
-            with open(save_path, "a") as file:
-                file.write("Annotations:\n")
-
-            # Sort the annotations by Time
-            sort = self.annotations.sort_values(["Time"])
-
-            # Append the annotations to the output text file.
-            sort.to_csv(save_path,
-                        header=False,
-                        index=False,
-                        sep="\t",
-                        mode="a")
+            with textio.open_target(save_path, compression) as file:
+                # Write the pressure rows, then the sorted annotations, through
+                # the same file object. Fixed point pressures are converted
+                # back to mmHg a block at a time.
+                blocks, columns = self.blocks(), self.columns
+                if self.pressures_3d is not None:
+                    blocks, columns = self._blocks_3d(), self._columns_3d()
+                textio.write_text(file, blocks, columns, self.annotations,
+                                  precision, time_precision, self.scale)
         except Exception as e:
             print(f"{type(e)} Was not able to save the data as a text file.")
             success = False
@@ -74,3 +869,104 @@ class Data():
         else:
             success = True
             return success
+
+
+def _locate(index, time_start, time_end):
+    """
+        Finds the positions [first, last) of time_start <= time < time_end in
+        a sorted time index using binary search. Returns (None, None) if the
+        index is not sorted. Pandas caches the sorted check on the index so it
+        is only computed once.
+    """
+
+    if not index.is_monotonic_increasing:
+        return None, None
+    first, last = np.searchsorted(index.values, (time_start, time_end))
+    return int(first), int(last)
+
+
+def _reduce(times, values, factor, method):
+    """
+        Reduces blocks of factor consecutive rows of values. The last block
+        may be shorter. Returns the time of each reduced row and the reduced
+        values as float.
+    """
+
+    rows = len(values)
+    full = rows - rows % factor
+    starts = np.arange(0, rows, factor)
+    blocks = values[:full].reshape((-1, factor) + values.shape[1:])
+    tail = values[full:]
+
+    def apply(reduction):
+        reduced = reduction(blocks, axis=1)
+        if len(tail):
+            reduced = np.concatenate((reduced, reduction(tail, axis=0)[None]))
+        return reduced
+
+    if method == "mean":
+        return times[starts], apply(
+            lambda x, axis: np.mean(x, axis=axis, dtype="float64"))
+    if method == "min":
+        return times[starts], apply(np.min)
+    if method == "max":
+        return times[starts], apply(np.max)
+
+    # Minimum at the start and maximum at the middle of each block
+    middles = np.minimum(starts + factor // 2, rows - 1)
+    low, high = apply(np.min), apply(np.max)
+    reduced = np.empty((2 * len(low),) + low.shape[1:], dtype=low.dtype)
+    reduced[0::2], reduced[1::2] = low, high
+    stamps = np.empty(2 * len(starts), dtype=times.dtype)
+    stamps[0::2], stamps[1::2] = times[starts], times[middles]
+    return stamps, reduced
+
+
+def _restore(values, dtype):
+    """
+        Converts reduced values back to the storage type. Integer pressures
+        are rounded as they are still in units of the scale.
+    """
+
+    if np.dtype(dtype).kind in "iu":
+        return np.rint(values).astype(dtype)
+    return values.astype(dtype, copy=False)
+
+
+def _gather(values, rows, positions, scale=None):
+    """
+        Gathers the columns at positions of the rows (window, sample) of
+        values into a float array of shape (window, sample, column).
+    """
+
+    Z = storage.decode(values[rows[:, :, None], positions], scale)
+    return Z.astype("float64", copy=False)
+
+
+def _interpolate(times, values, rows, firsts, lengths, positions, grid,
+                 scale=None):
+    """
+        Linearly interpolates the columns at positions of each window onto the
+        time stamps of grid (window, sample). rows holds the row at or before
+        each time stamp. A window only uses its own rows and holds its first
+        and last value beyond its samples. Windows with fewer than two samples
+        are NaN.
+    """
+
+    lows = firsts[:, None]
+    highs = (firsts + lengths - 2)[:, None]
+    rows = np.clip(rows, lows, np.maximum(highs, lows))
+    short = np.broadcast_to(lengths[:, None] < 2, grid.shape)
+    rows[short] = 0
+    if len(times) < 2:
+        return np.full(grid.shape + (len(positions),), np.nan)
+
+    t_low, t_high = times[rows], times[rows + 1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = np.clip((grid - t_low) / (t_high - t_low), 0, 1)
+    weight = np.nan_to_num(weight)[:, :, None]
+    low = _gather(values, rows, positions, scale)
+    high = _gather(values, rows + 1, positions, scale)
+    Z = low + (high - low) * weight
+    Z[short] = np.nan
+    return Z
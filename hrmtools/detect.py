@@ -0,0 +1,209 @@
+import numpy as np
+import pandas as pd
+from . import storage
+
+
+class SwallowDetector():
+    """
+        Detects candidate swallows in a stream of pressure blocks. A swallow
+        is a run of samples where the highest pressure across the pharyngeal
+        and UES sensors is at or above threshold. Runs separated by less than
+        merge_gap seconds are joined. Each block is processed with array
+        operations and only the swallow that is still open at the end of a
+        block is carried to the next one, so memory use is bounded by the
+        size of a block.
+
+        Feed blocks in time order with feed and call finish after the last
+        block. Every event gets a confidence between 0 and 1 from its peak
+        pressure above threshold and its duration.
+    """
+
+    def __init__(self, sensors=range(1, 5), threshold=80.0, min_duration=0.1,
+                 max_duration=2.0, merge_gap=0.5, text="Swallow"):
+        self.sensors = [int(sensor) for sensor in sensors]
+        self.threshold = float(threshold)
+        # Runs shorter than min_duration seconds are dropped. Events longer
+        # than max_duration seconds get a lower confidence.
+        self.min_duration = float(min_duration)
+        self.max_duration = float(max_duration)
+        self.merge_gap = float(merge_gap)
+        self.text = text
+        self._events = []
+        # Swallow that has not ended yet: [start, end, peak]
+        self._pending = None
+        # True if the pending swallow was above threshold at the end of the
+        # last block
+        self._open = False
+
+    def __repr__(self):
+        """
+            String representation of the SwallowDetector object.
+        """
+        expression = (f"SwallowDetector(sensors={self.sensors}, "
+                      f"threshold={self.threshold}, "
+                      f"events={len(self._events)})")
+        return expression
+
+    @property
+    def events(self):
+        """
+            The swallows detected so far as an annotation dataframe indexed by
+            time with the columns Text, Confidence, End and Peak.
+        """
+
+        rows = np.array(self._events, dtype="float64").reshape(-1, 4)
+        index = pd.Index(rows[:, 0], name="Time")
+        return pd.DataFrame({
+            "Text": pd.Series([self.text] * len(rows), index=index,
+                              dtype="object"),
+            "Confidence": rows[:, 3],
+            "End": rows[:, 1],
+            "Peak": rows[:, 2]}, index=index)
+
+    def feed(self, times, values=None, columns=None):
+        """
+            Processes the next block of pressures.
+
+            Arguments:
+            ----------
+            times {numpy array | pandas data frame} -- time stamps of the
+            block. A dataframe such as a block of Import.iter_chunks can be
+            given instead of times, values and columns.
+
+            values {numpy array} -- float pressures of the block (time,
+            sensor).
+
+            columns {list int} -- sensor number of each column of values.
+
+            Returns:
+            --------
+            count {int} -- number of swallows completed by this block.
+        """
+
+        if hasattr(times, "columns"):
+            times, values, columns = (times.index.values, times.to_numpy(),
+                                      list(times.columns))
+        if not len(times):
+            return 0
+
+        lookup = {int(column): idx for idx, column in enumerate(columns)}
+        try:
+            positions = [lookup[sensor] for sensor in self.sensors]
+        except KeyError as e:
+            raise KeyError(f"Sensor {e} is not in the block.") from None
+
+        signal = np.asarray(values)[:, positions].max(axis=1)
+        above = signal >= self.threshold
+
+        # Start and end of each run above threshold. A run that was open at
+        # the end of the last block continues at the first sample.
+        padded = np.zeros(len(above) + 2, dtype="int8")
+        padded[1:-1] = above
+        padded[0] = self._open
+        steps = np.diff(padded)
+        starts = np.flatnonzero(steps == 1)
+        ends = np.flatnonzero(steps == -1)
+        if self._open and above[0]:
+            starts = np.concatenate(([0], starts))
+        elif self._open:
+            # The open run ended right at the end of the last block
+            self._open = False
+            ends = ends[ends > 0]
+
+        count = len(self._events)
+        if len(starts):
+            peaks = np.maximum.reduceat(signal, starts)
+            for start, end, peak in zip(starts, ends, peaks):
+                self._add(times, start, end, peak)
+        self._open = bool(above[-1])
+
+        # Close the pending swallow once the stream is past its merge gap
+        if (self._pending is not None and not self._open
+                and times[-1] - self._pending[1] > self.merge_gap):
+            self._close()
+
+        return len(self._events) - count
+
+    def finish(self):
+        """
+            Closes the swallow still open at the end of the stream.
+
+            Returns:
+            --------
+            events {pandas data frame} -- all detected swallows.
+        """
+
+        if self._pending is not None:
+            self._close()
+        self._open = False
+        return self.events
+
+    def _add(self, times, start, end, peak):
+        """
+            Adds the run of samples [start, end) of a block, merging it with
+            the pending swallow if it is close enough.
+        """
+
+        continues = self._open and start == 0
+        t_start, t_end = float(times[start]), float(times[end - 1])
+        if self._pending is not None and (
+                continues or t_start - self._pending[1] <= self.merge_gap):
+            self._pending[1] = t_end
+            self._pending[2] = max(self._pending[2], float(peak))
+            return
+
+        if self._pending is not None:
+            self._close()
+        self._pending = [t_start, t_end, float(peak)]
+
+    def _close(self):
+        """
+            Scores the pending swallow and adds it to the events.
+        """
+
+        start, end, peak = self._pending
+        self._pending = None
+        duration = end - start
+        if duration < self.min_duration:
+            return
+
+        # Higher peaks and durations between min_duration and max_duration
+        # give a higher confidence.
+        amplitude = 1 - np.exp(-(peak - self.threshold) / self.threshold)
+        length = (min(1.0, duration / (2 * self.min_duration))
+                  * min(1.0, self.max_duration / duration))
+        self._events.append((start, end, peak, amplitude * length))
+
+
+def detect(data, rows=1 << 16, **options):
+    """
+        Detects candidate swallows over an entire recording in one pass over
+        blocks of rows. Works on pressures held in memory and in a store.
+
+        Arguments:
+        ----------
+        data {Data} -- the data object of an HRM object.
+
+        rows {int} -- Optional. Number of rows per block.
+
+        options -- Optional. Arguments of SwallowDetector.
+
+        Returns:
+        --------
+        events {pandas data frame} -- the detected swallows indexed by time
+        with the columns Text, Confidence, End and Peak.
+    """
+
+    detector = SwallowDetector(**options)
+    if data.empty:
+        return detector.finish()
+
+    columns = data.columns
+    positions = [columns.index(sensor) for sensor in detector.sensors]
+    sensors = [columns[position] for position in positions]
+    for times, values in data.blocks(rows):
+        # Only decode the sensors used for detection
+        values = storage.decode(values[:, positions], data.scale)
+        detector.feed(times, values, sensors)
+
+    return detector.finish()
@@ -0,0 +1,237 @@
+from collections import deque
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from . import storage
+
+
+# Ways of estimating the baseline of each sensor
+METHODS = ("percentile", "rest")
+
+
+class DriftCorrector():
+    """
+        Removes the slow drift of the baseline pressure of every sensor from a
+        stream of pressure blocks. Feed blocks in time order with feed, which
+        returns the corrected pressures, and call finish after the last block.
+
+        With method "percentile" the stream is divided into steps of step
+        seconds. The low percentile of each sensor is calculated for every
+        completed step, and the baseline of a step is the median of these
+        values over the preceding window seconds. Only the last window
+        seconds of step values and the rows of the unfinished step are
+        carried between blocks, so results do not depend on how the stream
+        is split into blocks. The rows of the first step are held back until
+        that step is complete, because it has no earlier steps to use.
+
+        With method "rest" the baselines are measured beforehand in resting
+        periods (see rest_baselines) and linearly interpolated in time between
+        them.
+    """
+
+    def __init__(self, rate, method="percentile", window=30.0, step=1.0,
+                 percentile=10.0, rest=None):
+        if method not in METHODS:
+            raise Exception(f"method must be one of {METHODS}.")
+        if method == "rest" and rest is None:
+            raise Exception("rest baselines are required for method 'rest'.")
+
+        self.method = method
+        self.percentile = float(percentile)
+        # Rows per step and steps per window
+        self.step = max(1, int(round(step * rate)))
+        self.steps = max(1, int(round(window / step)))
+        # Times and baselines (rest, sensor) of the resting periods
+        self.rest = rest
+        self._history = deque(maxlen=self.steps)
+        self._partial = None
+        self._held = None
+
+    def __repr__(self):
+        """
+            String representation of the DriftCorrector object.
+        """
+        expression = (f"DriftCorrector(method={self.method}, "
+                      f"step={self.step}, steps={self.steps}, "
+                      f"percentile={self.percentile})")
+        return expression
+
+    def feed(self, times, values):
+        """
+            Corrects the next block of pressures.
+
+            Arguments:
+            ----------
+            times {numpy array} -- time stamps of the block.
+
+            values {numpy array} -- float pressures of the block (time,
+            sensor).
+
+            Returns:
+            --------
+            values {numpy array} -- corrected pressures. With method
+            "percentile" the rows of the first step are returned once the
+            step is complete, all later rows are returned immediately.
+        """
+
+        values = np.asarray(values, dtype="float64")
+        if self.method == "rest":
+            return values - self._rest_baseline(times)
+
+        if not self._history:
+            # Hold the first step back until it is complete
+            if self._held is not None:
+                values = np.concatenate((self._held, values))
+                self._held = None
+            if len(values) < self.step:
+                self._held = values
+                return values[:0]
+            first = values[:self.step]
+            level = np.percentile(first, self.percentile, axis=0)
+            self._history.append(level)
+            self._partial = first[:0]
+            return np.concatenate((first - level,
+                                   self._correct(values[self.step:])))
+
+        return self._correct(values)
+
+    def finish(self):
+        """
+            Returns the rows still held back if the stream ended before the
+            first step was complete. They are corrected with the percentile
+            of the rows that were seen.
+        """
+
+        if self._held is None:
+            return np.empty((0, 0))
+        held, self._held = self._held, None
+        return held - np.percentile(held, self.percentile, axis=0)
+
+    def _correct(self, values):
+        """
+            Subtracts the baselines of the steps the rows belong to and
+            updates the step values with the completed steps.
+        """
+
+        if not len(values):
+            return values
+
+        filled = len(self._partial)
+        combined = np.concatenate((self._partial, values))
+        complete = len(combined) // self.step
+
+        # Low percentile of each step completed by these rows
+        levels = np.percentile(
+            combined[:complete * self.step].reshape(
+                (complete, self.step) + combined.shape[1:]),
+            self.percentile, axis=1)
+
+        # Baseline of the current step and of each following step: the median
+        # over the preceding window. Missing history is NaN and ignored.
+        history = np.array(self._history)
+        missing = self.steps - len(history)
+        padded = np.concatenate(
+            (np.full((missing,) + history.shape[1:], np.nan), history,
+             levels))
+        windows = sliding_window_view(padded, self.steps, axis=0)
+        baselines = np.nanmedian(windows[:complete + 1], axis=-1)
+
+        index = (filled + np.arange(len(values))) // self.step
+        corrected = values - baselines[index]
+
+        self._history.extend(levels)
+        self._partial = combined[complete * self.step:].copy()
+        return corrected
+
+    def _rest_baseline(self, times):
+        """
+            Baseline of each sensor at times, interpolated between the
+            resting periods.
+        """
+
+        rest_times, baselines = self.rest
+        return np.column_stack([np.interp(times, rest_times, baselines[:, idx])
+                                for idx in range(baselines.shape[1])])
+
+
+def rest_baselines(data, windows):
+    """
+        Measures the baseline of every sensor as its median pressure within
+        each resting period.
+
+        Arguments:
+        ----------
+        data {Data} -- the data object of an HRM object.
+
+        windows {iter} -- Pairs of start and end times of the resting periods
+        in SS.SS.
+
+        Returns:
+        --------
+        rest {tuple} -- middle time of each resting period and the baselines
+        of shape (period, sensor), sorted by time. Resting periods without
+        samples, for example past the end of the data, are left out.
+    """
+
+    windows = np.asarray(windows, dtype="float64").reshape(-1, 2)
+    if not len(windows):
+        raise Exception("At least one resting period is required.")
+    windows = windows[np.argsort(windows[:, 0])]
+    Z, times = data.segments(windows[:, 0], windows[:, 1], data.columns)
+
+    # Drop periods without samples. Their baselines would be NaN and spread
+    # over the whole recording by the interpolation.
+    found = ~np.isnan(times).all(axis=1)
+    if not found.any():
+        raise Exception("None of the resting periods contain any data.")
+    return windows[found].mean(axis=1), np.nanmedian(Z[found], axis=1)
+
+
+def correct(data, corrector, rows=1 << 16):
+    """
+        Corrects the pressures of data in place, block by block. The
+        corrected values are written back into the pressure dataframe so no
+        second copy of the recording is made. Pressures held in a store are
+        loaded first.
+
+        Arguments:
+        ----------
+        data {Data} -- the data object of an HRM object.
+
+        corrector {DriftCorrector} -- corrector to apply.
+
+        rows {int} -- Optional. Number of rows per block.
+
+        Returns:
+        --------
+        None
+    """
+
+    if data.empty:
+        raise Exception("No data has been loaded yet. Cannot correct.")
+
+    # Drop cached segments first. They can share memory with the pressures
+    # and would force a full copy on the first write.
+    segment_cache = getattr(data.hrm, "segment_cache", None)
+    if segment_cache is not None:
+        segment_cache.clear()
+
+    # Read through numpy views. A dataframe view of the pressures that is
+    # still alive while writing would also force a copy.
+    p = data.pressures
+    dtype = p.dtypes.iloc[0]
+    times, values = p.index.values, p.to_numpy()
+    written = 0
+    for first in range(0, len(p), rows):
+        block = storage.decode(values[first:first + rows], data.scale)
+        corrected = corrector.feed(times[first:first + rows], block)
+        if len(corrected):
+            p.iloc[written:written + len(corrected)] = storage.encode(
+                corrected, dtype, data.scale)
+            written += len(corrected)
+
+    held = corrector.finish()
+    if len(held):
+        p.iloc[written:written + len(held)] = storage.encode(
+            held, dtype, data.scale)
+
+    data.modified()
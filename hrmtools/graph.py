@@ -77,8 +77,7 @@ class Graph(ABC):
                 # the current xtick values as indexes for the time index column
                 # of the data segment stored in Z. Effectively gets the xtick
                 # labels in SS.SS
-                labels = [
-                    self.hrm.plot.Z.index.values[int(idx)] for idx in values]
+                labels = self.hrm.plot.Z.index.values[values.astype(int)]
 
                 # Convert the SS.SS xtick labels to MM:SS.S
                 labels = ctime.time_in_min(labels)
@@ -97,8 +96,7 @@ class Graph(ABC):
                 # Use the current xtick vales as indexes for thet tiem index
                 # column of the data segment stored in Z. Effectively gets the
                 # xtick labels in SS.SS.
-                labels = [
-                    self.hrm.plot.Z.index.values[int(idx)] for idx in values]
+                labels = self.hrm.plot.Z.index.values[values.astype(int)]
 
                 # Update the xticks with the new values and labels
                 plt.xticks(values, labels)
@@ -1,7 +1,9 @@
 from .plot import Plot
 from .cimp import Import
 from .data import Data
-from . import ctime
+from .metrics import Metrics
+from .segcache import SegmentCache
+from . import ctime, detect, drift
 
 
 class HRM():
@@ -17,12 +19,20 @@ class HRM():
         self.data = Data(self)
         self.import_data = Import(self)
         self.plot = Plot(self)
+        self.metrics = Metrics(self)
+        # Results of get_segment are kept so plots and calculations on the
+        # same window do not slice the data again.
+        self.segment_cache = SegmentCache()
 
     def get_segment(self, time_seg, sensors):
         """
             This function segments the full HRM pressure data frame to only
             include the segment indicated by the input arguments. Can segment by
-            both time and sensors.
+            both time and sensors. Results are kept in segment_cache and the
+            same dataframes are returned for repeated calls, so copy them
+            before changing them. The cache is dropped when the pressures or
+            annotations are replaced, but changes made to them in place are
+            not detected. Call data.modified() after such changes.
 
             Arguments: 
             ----------
@@ -44,9 +54,8 @@ class HRM():
             column.
          """
 
-        # Check if any data has been loaded. If self.data.pressures is None,
-        # getattr will return the default value of True.
-        if getattr(self.data.pressures, "empty", True):
+        # Check if any data has been loaded.
+        if self.data.empty:
             raise Exception("No data has been loaded yet. Cannot segment.")
 
         # Create a copy as a list from the input time_seg and sensors.
@@ -58,17 +67,208 @@ class HRM():
         # then convert each of the times to float.
         time_start, time_end = self.process_time_seg(time_seg)
 
-        # Select portion of the dataframe bewteen time segments
-        p = self.data.pressures
-        Z = p.loc[(p.index >= time_start) & (p.index < time_end), sensors]
+        # Select portion of the dataframe bewteen time segments and the
+        # portion of the annotation dataframe that is between time segments.
+        # Reuse the result of an earlier call for the same segment.
+        def compute():
+            Z = self.data.segment(time_start, time_end, sensors)
+            ann = self.data.annotation_segment(time_start, time_end)
+            return Z, ann
 
-        # Select the portion of the annotation dataframe that is between time
-        # segments
-        a = self.data.annotations
-        ann = a.loc[(a.index >= time_start) & (a.index < time_end)]
+        key = ("segment", time_start, time_end, tuple(sensors),
+               self.data.storage)
+        Z, ann = self.segment_cache.get(key, self.data.version, compute)
 
         return Z, ann
 
+    def get_segments(self, windows, sensors, align="pad", samples=None):
+        """
+            Segments the HRM pressure data by many time windows at once. All
+            windows are returned in one array so no dataframe has to be built
+            per window.
+
+            Arguments: 
+            ----------
+            windows {iter} -- Pairs of start and end times given as either
+            float or string. Ex: [(78.3, 82.1), ("1:40.0", "1:44.0")]
+
+            sensors {iter int} -- The sensors to include.
+
+            align {string} -- Optional. "pad" fills shorter windows with NaN,
+            "truncate" cuts all windows to the shortest and "resample"
+            interpolates every window onto the same number of evenly spaced
+            samples. Defaults to "pad".
+
+            samples {int} -- Optional. Number of samples per window.
+
+            Returns:
+            --------
+            Z {numpy array} -- Pressures of shape (window, sample, sensor).
+
+            times {numpy array} -- Time in SS.SS of each sample of shape
+            (window, sample). NaN where a window was padded.
+
+            anns {list pandas data frame} -- The annotations within each
+            window.
+        """
+
+        # Check if any data has been loaded.
+        if self.data.empty:
+            raise Exception("No data has been loaded yet. Cannot segment.")
+
+        sensors = [int(i) for i in sensors]
+        time_segs = [self.process_time_seg(time_seg) for time_seg in windows]
+        starts = [time_seg[0] for time_seg in time_segs]
+        ends = [time_seg[1] for time_seg in time_segs]
+
+        Z, times = self.data.segments(starts, ends, sensors, align, samples)
+        anns = self.data.annotation_segments(starts, ends)
+
+        return Z, times, anns
+
+    def get_epochs(self, text, pre=5.0, post=15.0, sensors=range(1, 37),
+                   regex=False):
+        """
+            Segments the HRM pressure data around every annotation whose text
+            matches, for example every "WS" marker. All epochs are returned in
+            one array.
+
+            Arguments: 
+            ----------
+            text {string} -- Annotation text to match.
+
+            pre {float} -- Optional. Seconds before each annotation. Defaults
+            to 5.
+
+            post {float} -- Optional. Seconds after each annotation. Defaults
+            to 15.
+
+            sensors {iter int} -- Optional. The sensors to include. Defaults
+            to all 36 sensors.
+
+            regex {bool} -- Optional. Match text as a regular expression.
+
+            Returns:
+            --------
+            Z {numpy array} -- Pressures of shape (epoch, sample, sensor).
+
+            offsets {numpy array} -- Time of each sample relative to its
+            annotation in seconds.
+
+            events {pandas data frame} -- The matching annotations with the
+            row of the pressure data they are anchored at.
+        """
+
+        sensors = [int(i) for i in sensors]
+        return self.data.epochs(text, pre, post, sensors, regex)
+
+    def get_segment_3d(self, time_seg):
+        """
+            Segments the 3D sensor pressures of a 3D HRM recording by time.
+
+            Arguments: 
+            ----------
+            time_seg {iter float | iter string} -- Must be paired given as
+            either float or string. Can be in the format of (78.3, 82.1) or as
+            ("1:18.3", "1:22.1")
+
+            Returns:
+            --------
+            Z {numpy array} -- Segment of the 3D pressures. Of shape (time,
+            level, sector).
+
+            times {numpy array} -- The time in SS.SS of each row of Z.
+
+            ann {pandas data frame} -- The annotation text and time that are
+            within the time range of the segment.
+        """
+
+        time_start, time_end = self.process_time_seg(time_seg)
+
+        def compute():
+            Z, times = self.data.segment_3d(time_start, time_end)
+            ann = self.data.annotation_segment(time_start, time_end)
+            return Z, times, ann
+
+        key = ("segment_3d", time_start, time_end, self.data.storage)
+        Z, times, ann = self.segment_cache.get(key, self.data.version, compute)
+
+        return Z, times, ann
+
+    def detect_swallows(self, annotate=False, **options):
+        """
+            Detects candidate swallows over the whole recording from the
+            pharyngeal and UES sensors in one pass.
+
+            Arguments:
+            ----------
+            annotate {bool} -- Optional. Add the detected swallows to the
+            annotations. Defaults to False.
+
+            options -- Optional. Arguments of detect.SwallowDetector such as
+            sensors (defaults to 1 to 4) and threshold (defaults to 80 mmHg).
+
+            Returns:
+            --------
+            events {pandas data frame} -- The detected swallows indexed by
+            time with the columns Text, Confidence, End and Peak.
+        """
+
+        events = detect.detect(self.data, **options)
+        if annotate:
+            index = self.data.annotation_index
+            for time, text in zip(events.index, events["Text"]):
+                index.insert(time, text)
+        return events
+
+    def correct_drift(self, method="percentile", rest=None, rest_text=None,
+                      rest_duration=10.0, rows=1 << 16, **options):
+        """
+            Subtracts the drifting baseline of every sensor from the pressures
+            in place, block by block.
+
+            Arguments:
+            ----------
+            method {string} -- Optional. "percentile" estimates the baseline
+            as a rolling low percentile. "rest" interpolates between baselines
+            measured in resting periods. Defaults to "percentile".
+
+            rest {iter} -- Optional. Pairs of start and end times of the
+            resting periods for method "rest". Ex: [(0, 10), ("5:00", "5:10")]
+
+            rest_text {string} -- Optional. Use the annotations with this text
+            as the start of the resting periods instead of rest.
+
+            rest_duration {float} -- Optional. Duration in seconds of the
+            resting periods started by annotations. Defaults to 10.
+
+            rows {int} -- Optional. Number of rows per block.
+
+            options -- Optional. Arguments of drift.DriftCorrector such as
+            window, step and percentile.
+
+            Returns:
+            --------
+            None
+        """
+
+        if self.data.empty:
+            raise Exception("No data has been loaded yet. Cannot correct.")
+
+        baselines = None
+        if method == "rest":
+            if rest_text is not None:
+                starts = self.data.annotation_index.find(rest_text)
+                rest = [(start, start + rest_duration) for start in starts]
+            else:
+                rest = [self.process_time_seg(time_seg)
+                        for time_seg in rest or []]
+            baselines = drift.rest_baselines(self.data, rest)
+
+        corrector = drift.DriftCorrector(self.data.sample_rate, method,
+                                         rest=baselines, **options)
+        drift.correct(self.data, corrector, rows)
+
     def process_time_seg(self, time_seg):
         """
             Processes the input time_seg. Checks to see if it is a pair of data
@@ -101,7 +301,7 @@ class HRM():
 
         return time_seg
 
-    def save_to_text(self, save_path):
+    def save_to_text(self, save_path, compression="infer", precision=2):
         """
             Saves the data currently stored in class properties df_HRM and
             df_ann to a text file. 
@@ -110,31 +310,20 @@ class HRM():
                 save_path {string} -- location of the new text file including
                 name
 
+                compression {string | None} -- Optional. "gzip", "bz2", "xz"
+                or None. Inferred from the extension of save_path by default.
+
+                precision {int} -- Optional. Number of decimals written for
+                the pressures.
+
             Returns:
                 success {bool} -- whether or not the save operation completed
                 successfully
         """
-        success = False
-        self.data.pressures.to_csv(save_path,
-                           header=True,
-                           index=False,
-                           sep="\t",
-                           mode="w")
-
-        with open(save_path, "a") as file:
-            file.write("Annotations:\n")
-
-        self.data.annotations.sort_index()
-        self.data.annotations.to_csv(save_path,
-                    header=False,
-                    index=True,
-                    sep="\t",
-                    mode="a")
-        success = True
-
-        return success
-
-        
+
+        return self.data.save_to_text(save_path, compression, precision)
+
+
 if __name__ == "__main__":
     h = HRM()
     h.import_data.from_text(
@@ -0,0 +1,343 @@
+import numpy as np
+import pandas as pd
+from . import contour
+
+
+# Thresholds of the Chicago classification in mmHg
+DCI_THRESHOLD = 20.0
+ISOBAR = 30.0
+
+
+class Metrics():
+    """
+        This class calculates swallow metrics (integrated relaxation pressure,
+        distal contractile integral, distal latency, break length and
+        contractile front velocity) for the data stored in the HRM "parent"
+        object. All swallows are calculated together with
+        array operations.
+
+        les and distal give the first and last sensor number of the lower
+        esophageal sphincter and of the distal esophagus (transition zone to
+        the proximal border of the LES). They depend on the placement of the
+        catheter and must be set before swallows are calculated.
+    """
+
+    def __init__(self, hrm, les=None, distal=None, gastric=None, spacing=1.0):
+        # Create link to HRM "parent" object
+        self.hrm = hrm
+        self.les = les
+        self.distal = distal
+        # Sensor in the stomach used as the reference of the IRP
+        self.gastric = gastric
+        # Distance between neighbouring sensors in cm
+        self.spacing = spacing
+
+    def __repr__(self):
+        """
+            String representation of the Metrics object.
+        """
+        expression = (f"Metrics(les={self.les}, distal={self.distal}, "
+                      f"gastric={self.gastric}, spacing={self.spacing})")
+        return expression
+
+    def swallows(self, text="WS", pre=2.0, post=13.0, regex=False):
+        """
+            Calculates the metrics of every swallow marked by an annotation
+            whose text matches. The annotation is taken as the swallow onset.
+
+            Arguments:
+            ----------
+            text {string} -- Optional. Annotation text marking swallows.
+            Defaults to "WS".
+
+            pre {float} -- Optional. Seconds before each annotation to include.
+
+            post {float} -- Optional. Seconds after each annotation to
+            include. Must cover the IRP window of 10 seconds.
+
+            regex {bool} -- Optional. Match text as a regular expression.
+
+            Returns:
+            --------
+            table {pandas data frame} -- One row per swallow indexed by the
+            annotation time with the columns Text, IRP, DCI, DL, Break and
+            CFV.
+        """
+
+        Z, offsets, events = self.hrm.get_epochs(text, pre, post,
+                                                 self._sensors(), regex)
+        table = self.calculate(Z, self._sensors(), onset=pre)
+        table.index = events.index
+        table.insert(0, "Text", events["Text"].to_numpy())
+        return table
+
+    def windows(self, windows):
+        """
+            Calculates the metrics of swallows given as time windows. The start
+            of each window is taken as the swallow onset.
+
+            Arguments:
+            ----------
+            windows {iter} -- Pairs of start and end times given as either
+            float or string. Ex: [(78.3, 93.3), ("1:40.0", "1:55.0")]
+
+            Returns:
+            --------
+            table {pandas data frame} -- One row per window indexed by the
+            start of the window with the columns IRP, DCI, DL, Break and CFV.
+        """
+
+        Z, times, _ = self.hrm.get_segments(windows, self._sensors())
+        table = self.calculate(Z, self._sensors())
+        table.index = pd.Index(times[:, 0], name="Time")
+        return table
+
+    def calculate(self, Z, sensors, onset=0.0):
+        """
+            Calculates the metrics of segments that were already extracted,
+            such as the output of HRM.get_segment or HRM.get_segments.
+
+            Arguments:
+            ----------
+            Z {pandas data frame | numpy array} -- pressures of one swallow
+            (time, sensor) or of many swallows (swallow, time, sensor).
+
+            sensors {list int} -- sensor number of each column of Z.
+
+            onset {float | numpy array} -- Optional. Seconds from the start of
+            each segment to the swallow onset.
+
+            Returns:
+            --------
+            table {pandas data frame} -- One row per swallow with the columns
+            IRP, DCI, DL, Break and CFV.
+        """
+
+        if self.les is None or self.distal is None:
+            raise Exception("Set the les and distal sensors before "
+                            "calculating swallow metrics.")
+
+        if hasattr(Z, "columns"):
+            sensors = list(Z.columns)
+        return swallow_metrics(np.asarray(Z, dtype="float64"),
+                               self.hrm.data.sample_rate, sensors, self.les,
+                               self.distal, onset, self.gastric, self.spacing)
+
+    def _sensors(self):
+        """
+            Sensors needed for the metrics.
+        """
+
+        if self.les is None or self.distal is None:
+            raise Exception("Set the les and distal sensors before "
+                            "calculating swallow metrics.")
+        sensors = set(range(self.les[0], self.les[1] + 1))
+        sensors.update(range(self.distal[0], self.distal[1] + 1))
+        if self.gastric is not None:
+            sensors.add(self.gastric)
+        return sorted(sensors)
+
+
+def swallow_metrics(Z, rate, sensors, les, distal, onset=0.0, gastric=None,
+                    spacing=1.0):
+    """
+        Calculates the integrated relaxation pressure, distal contractile
+        integral, distal latency, break length and contractile front velocity
+        of a batch of swallows.
+
+        Arguments:
+        ----------
+        Z {numpy array} -- pressures (swallow, time, sensor) or of a single
+        swallow (time, sensor).
+
+        rate {float} -- samples per second.
+
+        sensors {list int} -- sensor number of each column of Z.
+
+        les {tuple int} -- first and last sensor of the LES.
+
+        distal {tuple int} -- first and last sensor of the distal esophagus.
+
+        onset {float | numpy array} -- Optional. Seconds from the start of
+        each swallow to its onset.
+
+        gastric {int} -- Optional. Sensor in the stomach. Its median pressure
+        is subtracted from the IRP.
+
+        spacing {float} -- Optional. Distance between sensors in cm.
+
+        Returns:
+        --------
+        table {pandas data frame} -- One row per swallow with the columns IRP
+        (mmHg), DCI (mmHg s cm), DL (s), Break (cm) of the 20 mmHg isobar and
+        CFV (cm/s) of the 30 mmHg isobar.
+    """
+
+    Z = np.asarray(Z, dtype="float64")
+    if Z.ndim == 2:
+        Z = Z[None]
+
+    # Sample of the onset of each swallow
+    onsets = np.broadcast_to(np.rint(np.asarray(onset) * rate).astype(int),
+                             (len(Z),))
+
+    columns = {column: idx for idx, column in enumerate(sensors)}
+    les_Z = Z[:, :, _positions(columns, les)]
+    distal_Z = Z[:, :, _positions(columns, distal)]
+    gastric_Z = None
+    if gastric is not None:
+        gastric_Z = Z[:, :, columns[gastric]]
+
+    table = pd.DataFrame({
+        "IRP": irp(les_Z, rate, onsets, gastric=gastric_Z),
+        "DCI": dci(distal_Z, rate, onsets, spacing),
+        "DL": distal_latency(distal_Z, rate, onsets),
+        "Break": contour.break_length(distal_Z, DCI_THRESHOLD, spacing,
+                                      onsets),
+        "CFV": contour.front_velocity(distal_Z, rate, ISOBAR, spacing,
+                                      onsets),
+    })
+    table.index.name = "Swallow"
+    return table
+
+
+def irp(Z, rate, onsets=0, window=10.0, duration=4.0, gastric=None):
+    """
+        Integrated relaxation pressure. The mean of the lowest duration
+        seconds, contiguous or not, of the eSleeve pressure (the highest
+        pressure across the LES sensors at each sample) within window seconds
+        after the onset.
+
+        Arguments:
+        ----------
+        Z {numpy array} -- LES pressures (swallow, time, sensor).
+
+        rate {float} -- samples per second.
+
+        onsets {int | numpy array} -- Optional. Sample of each onset.
+
+        window {float} -- Optional. Seconds after the onset searched.
+
+        duration {float} -- Optional. Seconds of lowest pressure averaged.
+
+        gastric {numpy array} -- Optional. Gastric pressure (swallow, time).
+        Its median within the window is subtracted.
+
+        Returns:
+        --------
+        irp {numpy array} -- IRP of each swallow in mmHg. NaN if the window
+        holds fewer than duration seconds of data.
+    """
+
+    sleeve = Z.max(axis=2)
+    samples = int(round(window * rate))
+    lowest = int(round(duration * rate))
+
+    # Gather the window after each onset. Samples past the end are NaN and
+    # sort to the end.
+    rows = np.asarray(onsets).reshape(-1, 1) + np.arange(samples)
+    valid = rows < sleeve.shape[1]
+    rows = np.where(valid, rows, 0)
+    taken = np.where(valid, np.take_along_axis(sleeve, rows, axis=1), np.nan)
+
+    if gastric is not None:
+        reference = np.where(valid, np.take_along_axis(gastric, rows, axis=1),
+                             np.nan)
+        taken = taken - np.nanmedian(reference, axis=1, keepdims=True)
+
+    taken = np.sort(taken, axis=1)[:, :lowest]
+    return taken.mean(axis=1)
+
+
+def dci(Z, rate, onsets=0, spacing=1.0, threshold=DCI_THRESHOLD):
+    """
+        Distal contractile integral. The pressure above threshold integrated
+        over time and length of the distal esophagus from the onset to the
+        end of the segment.
+
+        Arguments:
+        ----------
+        Z {numpy array} -- distal esophageal pressures (swallow, time,
+        sensor).
+
+        rate {float} -- samples per second.
+
+        onsets {int | numpy array} -- Optional. Sample of each onset.
+
+        spacing {float} -- Optional. Distance between sensors in cm.
+
+        threshold {float} -- Optional. Pressure in mmHg below which pressure
+        is not counted.
+
+        Returns:
+        --------
+        dci {numpy array} -- DCI of each swallow in mmHg s cm.
+    """
+
+    above = np.clip(np.nan_to_num(_after(Z, onsets) - threshold, nan=0.0),
+                    0, None)
+    return above.sum(axis=(1, 2)) / rate * spacing
+
+
+def distal_latency(Z, rate, onsets=0, threshold=ISOBAR):
+    """
+        Distal latency. The time from the onset to the contractile
+        deceleration point. The arrival of the threshold isobar is found at
+        each distal sensor. The deceleration point is the sensor where the
+        arrival slows down the most, or the most distal sensor if the front
+        does not slow down.
+
+        Arguments:
+        ----------
+        Z {numpy array} -- distal esophageal pressures (swallow, time,
+        sensor) ordered from proximal to distal.
+
+        rate {float} -- samples per second.
+
+        onsets {int | numpy array} -- Optional. Sample of each onset.
+
+        threshold {float} -- Optional. Isobar in mmHg.
+
+        Returns:
+        --------
+        dl {numpy array} -- DL of each swallow in seconds. NaN if the isobar
+        does not reach at least one distal sensor.
+    """
+
+    # Arrival in samples after the onset so the differences are exact
+    arrival = contour.arrival(Z, threshold, onsets)
+    reached = ~np.isnan(arrival)
+
+    # Change of the arrival delay between neighbouring sensors. A large
+    # positive value marks the front slowing down.
+    slowing = np.full(arrival.shape, -np.inf)
+    if arrival.shape[1] >= 3:
+        slowing[:, 1:-1] = np.nan_to_num(np.diff(arrival, n=2, axis=1),
+                                         nan=-np.inf)
+    point = slowing.argmax(axis=1)
+
+    # Without a deceleration use the most distal sensor that was reached
+    last = arrival.shape[1] - 1 - np.argmax(reached[:, ::-1], axis=1)
+    point = np.where(slowing.max(axis=1) > 0, point, last)
+    dl = arrival[np.arange(len(arrival)), point] / rate
+    return np.where(reached.any(axis=1), dl, np.nan)
+
+
+def _positions(columns, bounds):
+    """
+        Column positions of the sensors bounds[0] to bounds[1].
+    """
+
+    try:
+        return [columns[sensor] for sensor in range(bounds[0], bounds[1] + 1)]
+    except KeyError as e:
+        raise KeyError(f"Sensor {e} is not in the segment.") from None
+
+
+def _after(Z, onsets):
+    """
+        Sets the samples before the onset of each swallow to NaN.
+    """
+
+    before = np.arange(Z.shape[1]) < np.asarray(onsets).reshape(-1, 1)
+    return np.where(before[:, :, None], np.nan, Z)
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+
+
+class SegmentCache():
+    """
+        Bounded least recently used cache of segment results. Used by
+        HRM.get_segment so repeated requests for the same window, such as
+        switching between plot types, do not slice the data again.
+
+        Each lookup passes the version of the Data object. When the version
+        changes the data has been replaced or modified and all cached results
+        are dropped.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = int(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.version = None
+        self._entries = OrderedDict()
+
+    def __repr__(self):
+        """
+            String representation of the SegmentCache object.
+        """
+        expression = (f"SegmentCache(entries={len(self)}, "
+                      f"max_entries={self.max_entries}, hits={self.hits}, "
+                      f"misses={self.misses})")
+        return expression
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version, compute):
+        """
+            Returns the cached result for key. On a miss the result is
+            computed by calling compute() and stored.
+
+            Arguments:
+            ----------
+            key {tuple} -- hashable description of the segment.
+
+            version {int} -- version of the data the segment is taken from.
+
+            compute {function} -- called without arguments to compute the
+            result on a miss.
+
+            Returns:
+            --------
+            result -- the cached or newly computed result.
+        """
+
+        if version != self.version:
+            self._entries.clear()
+            self.version = version
+
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        result = compute()
+        if self.max_entries > 0:
+            self._entries[key] = result
+            # Drop the least recently used results
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """
+            Drops all cached results and resets the hit and miss counters.
+        """
+
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
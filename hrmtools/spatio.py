@@ -136,13 +136,19 @@ class Spatio(Graph):
     def draw_anns(self):
         # Create shortcut for hrm.plot
         p = self.hrm.plot
-        ann_id = 1
-        for idx, ann in p.ann.iterrows():
-            x_position = ann.name
-            x_position = np.where(p.Z.index.values == x_position)[0][0]
-            text = ann["Text"]
-            self.annotations.add(x_position, text, ann_id, show_label=True)
-            ann_id += 1
+        times = p.Z.index.values
+        if not len(times):
+            return
+        # Query the annotation index for the plotted time range and find the
+        # sample column of every annotation in one search.
+        index = self.hrm.data.annotation_index
+        ann_times, texts = index.range(times[0],
+                                       np.nextafter(times[-1], np.inf))
+        x_positions = np.searchsorted(times, ann_times)
+        for ann_id, (x_position, text) in enumerate(zip(x_positions, texts),
+                                                    start=1):
+            self.annotations.add(int(x_position), text, ann_id,
+                                 show_label=True)
 
     def remove_anns(self):
         pass
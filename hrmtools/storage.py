@@ -0,0 +1,118 @@
+import warnings
+import numpy as np
+
+
+# Numeric types the pressures can be stored as. "int16" stores the pressures
+# as fixed point integers that are multiplied by a scale factor when read.
+STORAGE = ("float64", "float32", "int16")
+
+# Default scale factor of fixed point storage in mmHg. Gives a resolution of
+# 0.1 mmHg and a range of +-3276.7 mmHg with int16, enough for UES and
+# hypercontractile peaks.
+DEFAULT_SCALE = 0.1
+
+
+def check(storage, scale=None):
+    """
+        Validates a storage policy.
+
+        Arguments:
+        ----------
+        storage {string} -- one of "float64", "float32" or "int16".
+
+        scale {float} -- Optional. Scale factor for integer storage. Defaults
+        to DEFAULT_SCALE.
+
+        Returns:
+        --------
+        dtype {numpy.dtype} -- numeric type of the stored pressures.
+
+        scale {float | None} -- scale factor, None for float storage.
+    """
+
+    if str(np.dtype(storage)) not in STORAGE:
+        raise Exception(f"storage must be one of {STORAGE}.")
+
+    dtype = np.dtype(storage)
+    if dtype.kind != "i":
+        return dtype, None
+    return dtype, float(scale or DEFAULT_SCALE)
+
+
+def encode(values, dtype, scale=None):
+    """
+        Converts float pressures to the storage type. Integer storage rounds
+        to the nearest multiple of scale and clips to the range of the type
+        with a warning. Integer storage cannot hold NaN and raises an
+        exception instead.
+
+        Arguments:
+        ----------
+        values {numpy array} -- float pressures.
+
+        dtype {numpy.dtype} -- storage type.
+
+        scale {float} -- Optional. Scale factor for integer storage.
+
+        Returns:
+        --------
+        values {numpy array} -- pressures in the storage type.
+    """
+
+    dtype = np.dtype(dtype)
+    if dtype.kind != "i":
+        return np.asarray(values, dtype=dtype)
+
+    info = np.iinfo(dtype)
+    scaled = np.rint(np.asarray(values, dtype="float64") / scale)
+    if np.isnan(scaled).any():
+        raise Exception(f"{dtype} storage cannot hold NaN pressures. Use "
+                        "float storage instead.")
+    if scaled.size and (scaled.min() < info.min or scaled.max() > info.max):
+        warnings.warn(f"Pressures outside of +-{info.max * scale:g} mmHg were "
+                      f"clipped by {dtype} storage. Use a larger scale or "
+                      "float storage.", stacklevel=2)
+        np.clip(scaled, info.min, info.max, out=scaled)
+    return scaled.astype(dtype)
+
+
+def decode(values, scale=None):
+    """
+        Converts stored pressures back to float. Float pressures are returned
+        unchanged, integer pressures are multiplied by scale.
+
+        Arguments:
+        ----------
+        values {numpy array | pandas dataframe} -- stored pressures.
+
+        scale {float} -- Optional. Scale factor for integer storage.
+
+        Returns:
+        --------
+        values {numpy array | pandas dataframe} -- pressures as float.
+    """
+
+    if not scale or not is_integer(values):
+        return values
+    return values * scale
+
+
+def convert(values, scale, dtype, new_scale=None):
+    """
+        Converts pressures from one storage type to another.
+    """
+
+    if np.dtype(dtype).kind == "i" and is_integer(values) and scale == new_scale:
+        return values
+    return encode(decode(values, scale), dtype, new_scale)
+
+
+def is_integer(values):
+    """
+        True if values hold integer pressures.
+    """
+
+    dtypes = getattr(values, "dtypes", None)
+    if dtypes is not None and not hasattr(dtypes, "kind"):
+        return all(dtype.kind in "iu" for dtype in dtypes)
+    return np.dtype(values.dtype).kind in "iu"
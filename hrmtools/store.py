@@ -0,0 +1,596 @@
+from abc import ABC, abstractmethod
+import json
+import struct
+import numpy as np
+import pandas as pd
+from . import textio
+
+
+class Store(ABC):
+    """
+        Abstract base class for pressure backends that keep the pressure
+        matrix outside of a resident dataframe. A store is set on Data.store
+        and is used by HRM.get_segment to read only the requested time range.
+        Subclasses provide the times, columns and rows properties and the
+        _read method.
+    """
+
+    times = None
+    columns = None
+
+    def __repr__(self):
+        """
+            String representation of the store.
+        """
+        expression = f"{type(self).__name__}(shape={self.shape})"
+        return expression
+
+    @property
+    def rows(self):
+        """
+            Number of time samples in the store.
+        """
+        return len(self.times)
+
+    @property
+    def shape(self):
+        """
+            Shape of the pressure matrix (time, sensors).
+        """
+        return (self.rows, len(self.columns))
+
+    @property
+    def empty(self):
+        """
+            True if the store holds no samples.
+        """
+        return self.rows == 0
+
+    def locate(self, time_start, time_end):
+        """
+            Returns the row range [first, last) of the samples within
+            time_start <= time < time_end. The time index must be sorted.
+        """
+
+        first, last = np.searchsorted(self.times, (time_start, time_end))
+        return int(first), int(last)
+
+    def segment(self, time_start, time_end, sensors):
+        """
+            Reads the pressures of sensors within time_start <= time <
+            time_end.
+
+            Arguments:
+            ----------
+            time_start {float} -- start of the segment in SS.SS.
+
+            time_end {float} -- end of the segment in SS.SS.
+
+            sensors {list int} -- The sensors to read.
+
+            Returns:
+            --------
+            Z {pandas dataframe} -- Segment of pressure data indexed by time.
+        """
+
+        first, last = self.locate(time_start, time_end)
+        positions = self.positions(sensors)
+        times, values = self._read(first, last, positions)
+        index = pd.Index(times, name="Time")
+        return pd.DataFrame(values, index=index, columns=list(sensors),
+                            copy=False)
+
+    def to_frame(self):
+        """
+            Reads the entire pressure matrix into a dataframe.
+        """
+        return self.segment(-np.inf, np.inf, self.columns)
+
+    def positions(self, sensors):
+        """
+            Converts sensor numbers to column positions within the store.
+        """
+
+        lookup = {column: idx for idx, column in enumerate(self.columns)}
+        try:
+            return [lookup[int(sensor)] for sensor in sensors]
+        except KeyError as e:
+            raise KeyError(f"Sensor {e} is not stored.") from None
+
+    @abstractmethod
+    def _read(self, first, last, positions):
+        """
+            Returns the times and the pressures of the columns at positions for
+            the rows [first, last).
+        """
+        pass
+
+
+class MemmapStore(Store):
+    """
+        Pressure backend that keeps the pressure matrix in a memory-mapped
+        file. Only the pages of the time range being read are loaded and
+        several processes can open the same file while sharing a single copy
+        in the operating system's page cache.
+
+        The file holds a small JSON header (columns, dtype, annotations)
+        followed by the time array and the row-major pressure matrix.
+    """
+
+    magic = b"HRMMAP01"
+    alignment = 64
+
+    def __init__(self, path):
+        self.path = path
+
+        # Read the header describing the layout of the arrays.
+        with open(path, "rb") as file:
+            if file.read(len(self.magic)) != self.magic:
+                raise Exception(f"{path} is not a hrmtools memmap file.")
+            size, = struct.unpack("<Q", file.read(8))
+            self.header = json.loads(file.read(size).decode("utf-8"))
+
+        rows = self.header["rows"]
+        self.columns = self.header["columns"]
+        self.times = np.memmap(path, dtype="<f8", mode="r",
+                               offset=self.header["time_offset"],
+                               shape=(rows,))
+        self.values = np.memmap(path, dtype=np.dtype(self.header["dtype"]),
+                                mode="r", offset=self.header["values_offset"],
+                                shape=(rows, len(self.columns)))
+
+    @property
+    def scale(self):
+        """
+            Scale factor of integer pressures or None for float pressures.
+        """
+        return self.header.get("scale")
+
+    @property
+    def annotations(self):
+        """
+            Annotations stored in the header of the file as a dataframe.
+        """
+
+        ann = self.header.get("annotations", {"Time": [], "Text": []})
+        index = pd.Index(ann["Time"], dtype="float64", name="Time")
+        return pd.DataFrame({"Text": pd.Series(ann["Text"], index=index,
+                                               dtype="object")})
+
+    @classmethod
+    def create(cls, path, df_HRM, df_ann=None, scale=None):
+        """
+            Writes a pressure dataframe to a memmap file and opens it.
+
+            Arguments:
+            ----------
+            path {string} -- location of the new memmap file.
+
+            df_HRM {pandas dataframe} -- pressure data indexed by time.
+
+            df_ann {pandas dataframe} -- Optional. Annotations to store with
+            the pressures.
+
+            scale {float} -- Optional. Scale factor if the pressures are stored
+            as integers.
+
+            Returns:
+            --------
+            store {MemmapStore} -- the opened store.
+        """
+
+        values = df_HRM.to_numpy()
+        times = df_HRM.index.values.astype("<f8")
+        header = {"rows": len(times),
+                  "columns": [int(column) for column in df_HRM.columns],
+                  "dtype": values.dtype.newbyteorder("<").str,
+                  "scale": scale}
+        if df_ann is not None:
+            header["annotations"] = {
+                "Time": df_ann.index.values.astype("float64").tolist(),
+                "Text": df_ann["Text"].fillna("").astype(str).tolist()}
+
+        # The array offsets depend on the header length. Reserve space for the
+        # offsets, then align the arrays.
+        header["time_offset"] = header["values_offset"] = 0
+        size = len(json.dumps(header)) + 64
+        start = len(cls.magic) + 8 + size
+        header["time_offset"] = _align(start, cls.alignment)
+        header["values_offset"] = _align(header["time_offset"] + times.nbytes,
+                                         cls.alignment)
+        encoded = json.dumps(header).encode("utf-8").ljust(size)
+
+        with open(path, "wb") as file:
+            file.write(cls.magic)
+            file.write(struct.pack("<Q", size))
+            file.write(encoded)
+            file.seek(header["time_offset"])
+            file.write(times.tobytes())
+            file.seek(header["values_offset"])
+            # Write the pressures in blocks of rows to bound the memory used
+            # for byte order conversion.
+            dtype = np.dtype(header["dtype"])
+            for idx in range(0, len(values), 1 << 16):
+                block = values[idx:idx + (1 << 16)]
+                file.write(np.ascontiguousarray(block, dtype=dtype).tobytes())
+
+        return cls(path)
+
+    def _read(self, first, last, positions):
+        """
+            Copies the requested rows and columns out of the memory map.
+        """
+
+        times = np.array(self.times[first:last])
+        rows = self.values[first:last]
+        if positions == list(range(len(self.columns))):
+            values = np.array(rows)
+        else:
+            values = rows[:, positions]
+        return times, values
+
+
+class ChunkedStore(Store):
+    """
+        Pressure backend for the hrmtools binary container format. The
+        pressures are stored in chunks of a fixed duration, each holding the
+        times and the row-major pressures of its rows. A footer holds the
+        chunk index (byte offset, rows, first and last time of every chunk),
+        the annotations and any metadata. Reading a segment only reads the
+        chunks that overlap the requested time range.
+    """
+
+    magic = b"HRMCHK01"
+
+    def __init__(self, path):
+        self.path = path
+
+        # The footer is followed by its length and the magic bytes.
+        with open(path, "rb") as file:
+            if file.read(len(self.magic)) != self.magic:
+                raise Exception(f"{path} is not a hrmtools binary file.")
+            file.seek(-(8 + len(self.magic)), 2)
+            size, = struct.unpack("<Q", file.read(8))
+            if file.read(len(self.magic)) != self.magic:
+                raise Exception(f"{path} is incomplete.")
+            file.seek(-(8 + len(self.magic) + size), 2)
+            self.header = json.loads(file.read(size).decode("utf-8"))
+
+        self.columns = self.header["columns"]
+        self.dtype = np.dtype(self.header["dtype"])
+        chunks = np.array(self.header["chunks"], dtype="float64")
+        chunks = chunks.reshape(-1, 4)
+        self.offsets = chunks[:, 0].astype("int64")
+        self.counts = chunks[:, 1].astype("int64")
+        self.starts = chunks[:, 2]
+        self.ends = chunks[:, 3]
+        # Row number of the first row of every chunk
+        self.first_rows = np.concatenate(([0], np.cumsum(self.counts)))
+        self._times = None
+
+    @property
+    def rows(self):
+        """
+            Number of time samples in the file.
+        """
+        return int(self.first_rows[-1])
+
+    @property
+    def times(self):
+        """
+            Time stamps of all samples. Read from the file on first access.
+        """
+
+        if self._times is None:
+            self._times = self._read(0, self.rows, [])[0]
+        return self._times
+
+    @property
+    def scale(self):
+        """
+            Scale factor of integer pressures or None for float pressures.
+        """
+        return self.header.get("scale")
+
+    @property
+    def metadata(self):
+        """
+            Metadata dictionary stored with the recording.
+        """
+        return self.header.get("metadata", {})
+
+    @property
+    def annotations(self):
+        """
+            Annotations stored in the footer of the file as a dataframe.
+        """
+
+        ann = self.header.get("annotations", {"Time": [], "Text": []})
+        index = pd.Index(ann["Time"], dtype="float64", name="Time")
+        return pd.DataFrame({"Text": pd.Series(ann["Text"], index=index,
+                                               dtype="object")})
+
+    def locate(self, time_start, time_end):
+        """
+            Returns the row range [first, last) of the samples within
+            time_start <= time < time_end. Only the times of the chunks at the
+            edges of the range are read.
+        """
+
+        # Chunks that may contain samples of the range
+        low = int(np.searchsorted(self.ends, time_start, side="left"))
+        high = int(np.searchsorted(self.starts, time_end, side="left"))
+        if low >= high:
+            return int(self.first_rows[low]), int(self.first_rows[low])
+
+        first_times = self._read_chunk(low, times_only=True)
+        first = self.first_rows[low] + np.searchsorted(first_times, time_start)
+        last_times = self._read_chunk(high - 1, times_only=True)
+        last = (self.first_rows[high - 1]
+                + np.searchsorted(last_times, time_end))
+        return int(first), int(last)
+
+    @classmethod
+    def create(cls, path, blocks, columns, df_ann=None, scale=None,
+               chunk_seconds=10, metadata=None):
+        """
+            Writes pressure data to a new binary container file and opens it.
+
+            Arguments:
+            ----------
+            path {string} -- location of the new file.
+
+            blocks {iter tuple} -- (times, values) array pairs holding
+            consecutive rows of the pressure data. See Data.blocks.
+
+            columns {list int} -- sensor numbers of the pressure columns.
+
+            df_ann {pandas dataframe} -- Optional. Annotations to store.
+
+            scale {float} -- Optional. Scale factor if the pressures are stored
+            as integers.
+
+            chunk_seconds {float} -- Optional. Duration of each chunk.
+
+            metadata {dict} -- Optional. JSON serializable metadata to store.
+
+            Returns:
+            --------
+            store {ChunkedStore} -- the opened store.
+        """
+
+        header = {"columns": [int(column) for column in columns],
+                  "dtype": None,
+                  "scale": scale,
+                  "chunk_seconds": float(chunk_seconds),
+                  "chunks": [],
+                  "metadata": metadata or {}}
+        if df_ann is not None:
+            df_ann = df_ann.sort_index(kind="stable")
+            header["annotations"] = {
+                "Time": df_ann.index.values.astype("float64").tolist(),
+                "Text": df_ann["Text"].fillna("").astype(str).tolist()}
+
+        def write_chunk(file, times, values):
+            # Store the chunk and add it to the chunk index
+            header["chunks"].append([file.tell(), len(times),
+                                     float(times[0]), float(times[-1])])
+            file.write(np.ascontiguousarray(times, dtype="<f8").tobytes())
+            file.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+        with open(path, "wb") as file:
+            file.write(cls.magic)
+            origin, dtype = None, None
+            pending_times, pending_values, pending_chunk = [], [], None
+            for times, values in blocks:
+                if not len(times):
+                    continue
+                if origin is None:
+                    origin = times[0]
+                    dtype = values.dtype.newbyteorder("<")
+                    header["dtype"] = dtype.str
+
+                # Number of the chunk each row belongs to
+                numbers = np.floor((times - origin) / chunk_seconds)
+                cuts = np.flatnonzero(np.diff(numbers)) + 1
+                for part in np.split(np.arange(len(times)), cuts):
+                    number = numbers[part[0]]
+                    if pending_chunk is not None and number != pending_chunk:
+                        write_chunk(file, np.concatenate(pending_times),
+                                    np.concatenate(pending_values))
+                        pending_times, pending_values = [], []
+                    pending_chunk = number
+                    pending_times.append(times[part[0]:part[-1] + 1])
+                    pending_values.append(values[part[0]:part[-1] + 1])
+            if pending_times:
+                write_chunk(file, np.concatenate(pending_times),
+                            np.concatenate(pending_values))
+            if header["dtype"] is None:
+                header["dtype"] = np.dtype("<f8").str
+
+            # Footer followed by its length and the magic bytes
+            footer = json.dumps(header).encode("utf-8")
+            file.write(footer)
+            file.write(struct.pack("<Q", len(footer)))
+            file.write(cls.magic)
+
+        return cls(path)
+
+    def _read_chunk(self, idx, times_only=False, positions=None):
+        """
+            Reads the times and optionally the pressures of chunk idx.
+        """
+
+        count = int(self.counts[idx])
+        with open(self.path, "rb") as file:
+            file.seek(int(self.offsets[idx]))
+            times = np.fromfile(file, dtype="<f8", count=count)
+            if times_only:
+                return times
+            values = np.fromfile(file, dtype=self.dtype,
+                                 count=count * len(self.columns))
+        values = values.reshape(count, len(self.columns))
+        if positions is not None:
+            values = values[:, positions]
+        return times, values
+
+    def _read(self, first, last, positions):
+        """
+            Reads the rows [first, last) from the chunks that hold them.
+        """
+
+        low = int(np.searchsorted(self.first_rows, first, side="right")) - 1
+        high = int(np.searchsorted(self.first_rows, last, side="left"))
+        low = max(low, 0)
+        times, values = [], []
+        for idx in range(low, min(high, len(self.counts))):
+            if not positions:
+                chunk_times = self._read_chunk(idx, times_only=True)
+                chunk_values = np.empty((len(chunk_times), 0), self.dtype)
+            else:
+                chunk_times, chunk_values = self._read_chunk(
+                    idx, positions=positions)
+            # Trim the rows of the chunk outside of [first, last)
+            start = max(first - self.first_rows[idx], 0)
+            stop = min(last, self.first_rows[idx + 1]) - self.first_rows[idx]
+            times.append(chunk_times[start:stop])
+            values.append(chunk_values[start:stop])
+
+        if not times:
+            return (np.empty(0, "float64"),
+                    np.empty((0, len(positions)), self.dtype))
+        return np.concatenate(times), np.concatenate(values)
+
+
+class TextStore(Store):
+    """
+        Pressure backend that reads a HRM text file on demand. Opening the
+        file only scans it for the row count, the time span, the annotations
+        and the byte offset of every n-th row. Segments are then parsed from
+        just the rows that cover the requested time range. Meant for
+        uncompressed files, where seeking to a row does not decompress
+        everything before it.
+    """
+
+    def __init__(self, path, dtype="float64", scale=None, every=1024):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.every = int(every)
+
+        with textio.open_source(path) as file:
+            names = textio.check_header(textio.read_header(file), path)
+            # Only the standard sensors of 3D files are read
+            self.names = names[:textio.SENSORS + 1]
+            self.columns = [int(name) for name in self.names[1:]]
+            (self.end, self._rows, self.row_offsets,
+             self.row_times) = textio.index_rows(file, self.every)
+            file.seek(self.end)
+            self.annotations = textio.read_annotations(file)
+
+        self._times = None
+        self.time_span = self._time_span()
+
+    @property
+    def rows(self):
+        """
+            Number of time samples in the file.
+        """
+        return self._rows
+
+    @property
+    def times(self):
+        """
+            Time stamps of all samples. Parsed from the file on first access.
+        """
+
+        if self._times is None:
+            self._times = self._read(0, self.rows, [])[0]
+        return self._times
+
+    def locate(self, time_start, time_end):
+        """
+            Returns the row range [first, last) of the samples within
+            time_start <= time < time_end. Only the indexed rows around the
+            range are parsed.
+        """
+
+        # Indexed rows enclosing the range
+        low = max(int(np.searchsorted(self.row_times, time_start,
+                                      side="right")) - 1, 0)
+        high = int(np.searchsorted(self.row_times, time_end, side="left"))
+        first_row = low * self.every
+        last_row = min(high * self.every, self.rows)
+        if first_row >= last_row:
+            return first_row, first_row
+
+        times, _ = self._read(first_row, last_row, [])
+        first, last = np.searchsorted(times, (time_start, time_end))
+        return first_row + int(first), first_row + int(last)
+
+    def segment(self, time_start, time_end, sensors):
+        """
+            Parses the pressures of sensors within time_start <= time <
+            time_end from the rows of the file that cover the range.
+        """
+
+        low = max(int(np.searchsorted(self.row_times, time_start,
+                                      side="right")) - 1, 0)
+        high = int(np.searchsorted(self.row_times, time_end, side="left"))
+        positions = self.positions(sensors)
+        times, values = self._read(low * self.every,
+                                   min(high * self.every, self.rows),
+                                   positions)
+        first, last = np.searchsorted(times, (time_start, time_end))
+        index = pd.Index(times[first:last], name="Time")
+        return pd.DataFrame(values[first:last], index=index,
+                            columns=list(sensors), copy=False)
+
+    def _read(self, first, last, positions):
+        """
+            Parses the rows [first, last) starting from the closest indexed
+            row.
+        """
+
+        if first >= last:
+            return (np.empty(0, dtype="float64"),
+                    np.empty((0, len(positions)), dtype=self.dtype))
+
+        # Byte range holding the rows
+        low = first // self.every
+        high = -(-last // self.every)
+        start = int(self.row_offsets[low])
+        end = (int(self.row_offsets[high]) if high < len(self.row_offsets)
+               else self.end)
+
+        with textio.open_source(self.path) as file:
+            if len(positions):
+                times, values = textio.read_rows(file, start, end, self.names,
+                                                 self.dtype, self.scale)
+            else:
+                # Only the times are needed, do not parse the pressures
+                times = textio.read_times(file, start, end)
+                values = np.empty((len(times), 0), dtype=self.dtype)
+        skip = first - low * self.every
+        times = times[skip:skip + last - first]
+        values = values[skip:skip + last - first, positions]
+        return times, values
+
+    def _time_span(self):
+        """
+            Returns the time stamps of the first and last samples.
+        """
+
+        if not self.rows:
+            return None
+        first = self.row_times[0]
+        last = self._read((self.rows - 1) // self.every * self.every,
+                          self.rows, [])[0][-1]
+        return float(first), float(last)
+
+
+def _align(offset, alignment):
+    """
+        Rounds offset up to the next multiple of alignment.
+    """
+    return -(-offset // alignment) * alignment
@@ -0,0 +1,215 @@
+import io
+import time
+import numpy as np
+import pandas as pd
+from . import storage, textio
+
+
+class Tail():
+    """
+        Follows a text file that is still being written by the acquisition
+        software. Each call to poll parses only the rows appended since the
+        last call and appends them to the pressures of the HRM parent object.
+
+        The pressures are kept in arrays whose capacity doubles when full, so
+        appending costs time proportional to the new rows. Data.pressures is a
+        dataframe view of the filled part of these arrays. The 3D sensors of
+        a 3D file are split off into Data.pressures_3d like Import.from_text
+        does. Functions passed to subscribe are called with the new rows of
+        the standard sensors after every poll that found any.
+    """
+
+    def __init__(self, hrm, file_path, dtype="float64", scale=None,
+                 geometry=textio.GEOMETRY_3D):
+        self.hrm = hrm
+        self.file_path = file_path
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.geometry = geometry
+        # Number of standard sensor columns and (levels, sectors) of the 3D
+        # sensors. Known once the header has been read.
+        self.width = None
+        self.shape_3d = None
+        # Byte offset up to which the file has been parsed
+        self.offset = 0
+        self.names = None
+        self.rows = 0
+        # Set once the annotation marker has been written
+        self.finished = False
+        self.subscribers = []
+        self._times = np.empty(0, dtype="float64")
+        self._values = None
+        self._values_3d = None
+        self._marker = None
+
+    def __repr__(self):
+        """
+            String representation of the Tail object.
+        """
+        expression = (f"Tail(file_path={self.file_path}, rows={self.rows}, "
+                      f"offset={self.offset}, finished={self.finished})")
+        return expression
+
+    def subscribe(self, callback):
+        """
+            Registers a function that is called as callback(Z, ann) with a
+            dataframe of the newly appended rows and the current annotations.
+        """
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+            Removes a function registered with subscribe.
+        """
+        self.subscribers.remove(callback)
+
+    def poll(self):
+        """
+            Parses the complete rows appended to the file since the last poll.
+            Once the "Annotations:" row has been written the annotations are
+            read as well and the finished property is set.
+
+            Arguments:
+            ----------
+            None
+
+            Returns:
+            --------
+            rows {int} -- number of new pressure rows.
+        """
+
+        if self._marker is not None:
+            self._read_annotations()
+            return 0
+
+        with open(self.file_path, "rb") as file:
+            file.seek(self.offset)
+            new = file.read()
+
+        # Only parse complete rows. A partially written row is read again by
+        # the next poll.
+        end = new.rfind(b"\n") + 1
+        new = new[:end]
+        if not new:
+            return 0
+
+        if self.names is None:
+            header, _, new = new.partition(b"\n")
+            self.names = textio.check_header(
+                [name for name in header.decode("latin-1").rstrip("\r")
+                 .split("\t") if name], self.file_path)
+            self.offset += len(header) + 1
+            self.width, self.shape_3d = textio.layout(self.names,
+                                                      self.geometry)
+            self._values = np.empty((0, self.width), self.dtype)
+            if self.shape_3d:
+                self._values_3d = np.empty((0,) + self.shape_3d, self.dtype)
+
+        # Stop at the annotation marker if it has been written
+        found = (b"\n" + new).find(b"\n" + textio.MARKER)
+        if found >= 0:
+            self._marker = self.offset + found
+            new = new[:found]
+
+        times, values, values_3d = self._parse(new)
+        self.offset += len(new)
+        self._append(times, values, values_3d)
+
+        if self._marker is not None:
+            self._read_annotations()
+
+        if len(times):
+            Z = self._frame(self.rows - len(times), self.rows)
+            Z = storage.decode(Z, self.scale)
+            for callback in list(self.subscribers):
+                callback(Z, self.hrm.data.annotations)
+
+        return len(times)
+
+    def run(self, interval=0.5, stop=None, timeout=None):
+        """
+            Polls the file every interval seconds until the annotation marker
+            has been written, stop (a threading.Event) is set or timeout
+            seconds have passed.
+        """
+
+        started = time.monotonic()
+        while not self.finished:
+            if stop is not None and stop.is_set():
+                break
+            if timeout is not None and time.monotonic() - started > timeout:
+                break
+            if not self.poll():
+                time.sleep(interval)
+
+    def _parse(self, new):
+        """
+            Parses complete pressure rows from bytes.
+        """
+
+        if not new.strip():
+            values_3d = None
+            if self.shape_3d:
+                values_3d = np.empty((0,) + self.shape_3d, dtype=self.dtype)
+            return (np.empty(0, dtype="float64"),
+                    np.empty((0, self.width), dtype=self.dtype), values_3d)
+
+        df = pd.read_csv(io.BytesIO(new), sep="\t", header=None,
+                         names=self.names, usecols=range(len(self.names)),
+                         index_col=0, dtype="float64")
+        block = df.to_numpy()
+        values = storage.encode(block[:, :self.width], self.dtype, self.scale)
+        values_3d = None
+        if self.shape_3d:
+            values_3d = storage.encode(block[:, self.width:], self.dtype,
+                                       self.scale).reshape(
+                                           (len(block),) + self.shape_3d)
+        return df.index.values, values, values_3d
+
+    def _append(self, times, values, values_3d=None):
+        """
+            Appends rows to the arrays, doubling their capacity when needed,
+            and points Data.pressures and Data.pressures_3d at the filled
+            rows.
+        """
+
+        rows = self.rows + len(times)
+        if rows > len(self._times):
+            capacity = max(rows, 2 * len(self._times), 1024)
+            self._times = textio.grow(self._times[:self.rows], capacity)
+            self._values = textio.grow(self._values[:self.rows], capacity)
+            if self.shape_3d:
+                self._values_3d = textio.grow(self._values_3d[:self.rows],
+                                              capacity)
+        self._times[self.rows:rows] = times
+        self._values[self.rows:rows] = values
+        if self.shape_3d:
+            self._values_3d[self.rows:rows] = values_3d
+        self.rows = rows
+
+        data = self.hrm.data
+        data.pressures = self._frame(0, self.rows)
+        if self.shape_3d:
+            data.pressures_3d = self._values_3d[:self.rows]
+        data.storage = str(self.dtype)
+        data.scale = self.scale
+        if data.annotations is None:
+            data.annotations = textio.empty_annotations()
+
+    def _frame(self, first, last):
+        """
+            Dataframe view of the rows [first, last) of the arrays.
+        """
+        return textio.frame(self._times[first:last],
+                            self._values[first:last],
+                            self.names[:self.width + 1])
+
+    def _read_annotations(self):
+        """
+            Reads the annotations written after the marker.
+        """
+
+        with open(self.file_path, "rb") as file:
+            file.seek(self._marker)
+            self.hrm.data.annotations = textio.read_annotations(file)
+        self.finished = True
@@ -0,0 +1,749 @@
+import bz2
+import gzip
+import lzma
+import os
+import numpy as np
+import pandas as pd
+from . import storage
+
+
+# The row in the text file that separates the pressure data from the
+# annotations that are appended below it.
+MARKER = b"Annotations:"
+
+# Number of bytes read at a time when scanning a file and number of rows parsed
+# at a time when filling the pressure array.
+BLOCK_SIZE = 1 << 20
+CHUNK_ROWS = 1 << 16
+
+# Number of standard sensors of a ManoScan 360 catheter. 3D files have the 3D
+# sensors in additional columns after these.
+SENSORS = 36
+
+# Default (levels, sectors) layout of the 3D sensors of a 3D HRM catheter.
+GEOMETRY_3D = (16, 8)
+
+# Number of rows formatted at a time when writing a text file.
+WRITE_ROWS = 1 << 13
+
+# Leading bytes identifying compressed files and the matching open functions.
+# Files are decompressed while they are being read.
+COMPRESSION = {"gzip": (b"\x1f\x8b", gzip.open),
+               "bz2": (b"BZh", bz2.open),
+               "xz": (b"\xfd7zXZ\x00", lzma.open)}
+
+# File extensions used to select the compression when writing.
+EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+
+
+class Cancelled(Exception):
+    """
+        Raised inside a read when its cancel event has been set.
+    """
+    pass
+
+
+class Section():
+    """
+        Read only file-like view over a byte range of an open binary file.
+        Allows pandas to parse only the pressure block of the text file without
+        copying it out first.
+
+        If progress is given it is called as progress(bytes_read, bytes_total,
+        rows_read) after every read. If cancel (a threading.Event) is set the
+        next read raises Cancelled.
+    """
+
+    def __init__(self, file, end, progress=None, cancel=None):
+        self.file = file
+        self.end = end
+        self.progress = progress
+        self.cancel = cancel
+        self.start = file.tell()
+        self.rows = 0
+
+    def read(self, size=-1):
+        """
+            Reads up to size bytes without passing the end of the section.
+        """
+
+        if self.cancel is not None and self.cancel.is_set():
+            raise Cancelled("The read was cancelled.")
+
+        # Determine the number of bytes remaining in the section
+        remaining = self.end - self.file.tell()
+        if remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+
+        data = self.file.read(size)
+        if self.progress is not None:
+            self.rows += data.count(b"\n")
+            self.progress(self.file.tell() - self.start,
+                          self.end - self.start, self.rows)
+        return data
+
+    def readline(self, size=-1):
+        """
+            Reads a single line without passing the end of the section.
+        """
+
+        remaining = self.end - self.file.tell()
+        if remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+
+        return self.file.readline(size)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+
+def open_source(file_path):
+    """
+        Opens a text file for binary reading. Files compressed with gzip, bz2
+        or xz are detected by their leading bytes and decompressed while they
+        are read, without writing a temporary file.
+
+        Arguments:
+        ----------
+        file_path {string} -- path of the txt file.
+
+        Returns:
+        --------
+        file {binary file object} -- file object positioned at the start.
+    """
+
+    name = compression(file_path)
+    if name is not None:
+        return COMPRESSION[name][1](file_path, "rb")
+    return open(file_path, "rb")
+
+
+def compression(file_path):
+    """
+        Returns the compression of a text file ("gzip", "bz2" or "xz")
+        detected from its leading bytes, or None if it is not compressed.
+    """
+
+    with open(file_path, "rb") as file:
+        head = file.read(6)
+
+    for name, (magic, _) in COMPRESSION.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_target(save_path, compression="infer"):
+    """
+        Opens a text file for writing, compressing the output if requested.
+
+        Arguments:
+        ----------
+        save_path {string} -- location of the new text file.
+
+        compression {string | None} -- Optional. "gzip", "bz2", "xz" or None.
+        If "infer" the compression is chosen from the extension of save_path.
+
+        Returns:
+        --------
+        file {text file object} -- file object opened for writing.
+    """
+
+    if compression == "infer":
+        extension = os.path.splitext(save_path)[1].lower()
+        compression = EXTENSIONS.get(extension)
+
+    if compression is None:
+        return open(save_path, "w", newline="", buffering=BLOCK_SIZE)
+    if compression not in COMPRESSION:
+        raise Exception(f"Unknown compression {compression}.")
+
+    _, opener = COMPRESSION[compression]
+    return opener(save_path, "wt", newline="")
+
+
+def write_text(file, blocks, columns, df_ann, precision=2, time_precision=2,
+               scale=None):
+    """
+        Writes pressure data and annotations in the HRM text format read by
+        read_text. The pressure rows are formatted a block at a time with a
+        single format operation per block and the sorted annotations are
+        appended to the same file object.
+
+        Arguments:
+        ----------
+        file {text file object} -- file opened for writing.
+
+        blocks {iter tuple} -- (times, values) array pairs holding consecutive
+        rows of the pressure data.
+
+        columns {list int} -- sensor numbers of the pressure columns.
+
+        df_ann {pandas dataframe} -- annotations indexed by time.
+
+        precision {int} -- Optional. Number of decimals of the pressures.
+
+        time_precision {int} -- Optional. Number of decimals of the times.
+
+        scale {float} -- Optional. Scale factor of integer pressures.
+
+        Returns:
+        --------
+        None
+    """
+
+    # Header row followed by the pressure rows
+    file.write("\t".join(["TIME:"] + [str(c) for c in columns]) + "\n")
+    row = ("\t".join([f"%.{time_precision}f"]
+                     + [f"%.{precision}f"] * len(columns)) + "\n")
+    for times, values in blocks:
+        values = storage.decode(values, scale)
+        for idx in range(0, len(times), WRITE_ROWS):
+            block = np.empty((len(times[idx:idx + WRITE_ROWS]),
+                              len(columns) + 1), dtype="float64")
+            block[:, 0] = times[idx:idx + WRITE_ROWS]
+            block[:, 1:] = values[idx:idx + WRITE_ROWS]
+            file.write((row * len(block)) % tuple(block.ravel().tolist()))
+
+    # Marker row followed by the annotations sorted by time
+    file.write(MARKER.decode() + "\n")
+    if df_ann is not None and len(df_ann):
+        df_ann = df_ann.sort_index(kind="stable")
+        ann_row = f"%.{time_precision}f\t%s\n"
+        texts = df_ann["Text"].fillna("").astype(str).tolist()
+        file.write("".join(ann_row % (t, text) for t, text
+                           in zip(df_ann.index.values.tolist(), texts)))
+
+
+def scan(file, cancel=None):
+    """
+        Scans an open binary file from the start of a row for the row
+        containing the annotation marker. Counts the lines on the way so the
+        pressure array can be allocated up front. Returns the file to the
+        position it started from.
+
+        Arguments:
+        ----------
+        file {binary file object} -- file opened in "rb" mode.
+
+        cancel {threading.Event} -- Optional. Raises Cancelled when set.
+
+        Returns:
+        --------
+        offset {int} -- byte offset of the start of the "Annotations:" row. If
+        the file has no annotations this is the size of the file.
+
+        lines {int} -- number of lines between the starting position and the
+        offset.
+    """
+
+    start = file.tell()
+    position = start
+    lines = 0
+    # Keep the last bytes of the previous block so a marker split across
+    # two blocks is still found. The scan always starts at the beginning of a
+    # row so it is treated as following a newline.
+    carry = b"\n"
+    last = b"\n"
+
+    while True:
+        if cancel is not None and cancel.is_set():
+            raise Cancelled("The read was cancelled.")
+        block = file.read(BLOCK_SIZE)
+        if not block:
+            break
+        buffer = carry + block
+        found = buffer.find(b"\n" + MARKER)
+        if found >= 0:
+            # Position of the marker relative to the start of the block
+            relative = found + 1 - len(carry)
+            lines += block.count(b"\n", 0, max(relative, 0))
+            offset = position + relative
+            file.seek(start)
+            return offset, lines
+        lines += block.count(b"\n")
+        position += len(block)
+        last = block[-1:]
+        carry = buffer[-len(MARKER):]
+
+    # The file ended without an annotation marker. Count a final row that is
+    # missing its newline.
+    if last != b"\n":
+        lines += 1
+    file.seek(start)
+    return position, lines
+
+
+def index_rows(file, every=1024):
+    """
+        Scans the pressure rows of an open binary file without parsing them.
+        Finds the annotation marker, counts the rows and records the byte
+        offset and time stamp of every n-th row so any time range can later be
+        read on its own.
+
+        Arguments:
+        ----------
+        file {binary file object} -- file positioned at the first data row.
+
+        every {int} -- Optional. Interval in rows between indexed rows.
+
+        Returns:
+        --------
+        offset {int} -- byte offset of the start of the "Annotations:" row or
+        the size of the file if there are no annotations.
+
+        rows {int} -- number of pressure rows.
+
+        row_offsets {numpy array} -- byte offsets of rows 0, every, 2 *
+        every, ...
+
+        row_times {numpy array} -- time stamps of the indexed rows.
+    """
+
+    start = file.tell()
+    position = start
+    newlines = 0
+    offsets = [np.array([start], dtype="int64")]
+    carry = b"\n"
+    last = b"\n"
+    offset = None
+
+    while offset is None:
+        block = file.read(BLOCK_SIZE)
+        if not block:
+            break
+        buffer = carry + block
+        limit = len(block)
+        found = buffer.find(b"\n" + MARKER)
+        if found >= 0:
+            # Position of the marker relative to the start of the block. It
+            # is negative if the marker started in the previous block.
+            relative = found + 1 - len(carry)
+            limit = max(relative, 0)
+            offset = position + relative
+
+        # Offsets of the newlines within the block. Row i starts after the
+        # (i - 1)th newline.
+        positions = np.flatnonzero(
+            np.frombuffer(block, dtype="uint8", count=limit) == 10)
+        first = (every - 1 - newlines) % every
+        offsets.append(position + positions[first::every] + 1)
+        newlines += len(positions)
+        if offset is not None:
+            # The marker row always follows a newline
+            last = b"\n"
+        elif limit:
+            last = block[limit - 1:limit]
+        position += len(block)
+        carry = buffer[-len(MARKER):]
+
+    if offset is None:
+        offset = position
+    rows = newlines + (1 if last != b"\n" else 0)
+
+    # Drop a trailing offset that points at the marker or the end of file.
+    row_offsets = np.concatenate(offsets)
+    row_offsets = row_offsets[row_offsets < offset]
+
+    # Read the time stamp at the start of each indexed row
+    row_times = np.empty(len(row_offsets), dtype="float64")
+    for idx, row_offset in enumerate(row_offsets.tolist()):
+        file.seek(row_offset)
+        row_times[idx] = float(file.readline(64).split(b"\t", 1)[0])
+
+    file.seek(start)
+    return offset, rows, row_offsets, row_times
+
+
+def read_header(file):
+    """
+        Reads the header row of the text file and returns the column names.
+    """
+
+    line = file.readline().decode("latin-1").rstrip("\r\n")
+    return [name for name in line.split("\t") if name]
+
+
+def check_header(names, file_path):
+    """
+        Checks that the header row starts with the time column followed by the
+        sensor numbers. Returns the column names.
+    """
+
+    if (len(names) < 2 or not names[0].upper().startswith("TIME")
+            or not all(name.isdigit() for name in names[1:])):
+        raise Exception(f"{file_path} is not a HRM text file.")
+    return names
+
+
+def read_rows(file, start, end, names, dtype="float64", scale=None):
+    """
+        Parses the pressure rows in the byte range [start, end) of file.
+
+        Returns:
+        --------
+        times {numpy array} -- time stamps of the rows.
+
+        values {numpy array} -- pressures of the rows in dtype.
+    """
+
+    file.seek(start)
+    times, values = [], []
+    for chunk in _read_chunks(Section(file, end), names):
+        times.append(chunk.index.values)
+        values.append(storage.encode(chunk.to_numpy(), dtype, scale))
+
+    if not times:
+        return (np.empty(0, dtype="float64"),
+                np.empty((0, len(names) - 1), dtype=dtype))
+    return np.concatenate(times), np.concatenate(values)
+
+
+def read_times(file, start, end):
+    """
+        Parses only the time column of the pressure rows in the byte range
+        [start, end) of file. The pressures are skipped.
+
+        Returns:
+        --------
+        times {numpy array} -- time stamps of the rows.
+    """
+
+    file.seek(start)
+    try:
+        reader = pd.read_csv(Section(file, end), sep="\t", header=None,
+                             usecols=[0], dtype="float64",
+                             chunksize=CHUNK_ROWS)
+    except pd.errors.EmptyDataError:
+        return np.empty(0, dtype="float64")
+    with reader:
+        times = [chunk[0].to_numpy() for chunk in reader]
+
+    if not times:
+        return np.empty(0, dtype="float64")
+    return np.concatenate(times)
+
+
+def read_pressures(file, end, rows, names, dtype="float64", scale=None,
+                   geometry=None, progress=None, cancel=None):
+    """
+        Parses the pressure rows between the current position of file and end
+        directly into a single contiguous numeric array. Rows are parsed a chunk
+        at a time so peak memory stays close to the size of the final array.
+
+        If geometry is given and the file has the 3D HRM layout (the standard
+        36 sensors followed by levels * sectors 3D sensors) the 3D sensors are
+        stored in a separate contiguous array of shape (time, level, sector).
+
+        Arguments:
+        ----------
+        file {binary file object} -- file positioned at the first data row.
+
+        end {int} -- byte offset at which the pressure data stops.
+
+        rows {int} -- upper bound on the number of rows to be read.
+
+        names {list string} -- column names from the header row.
+
+        dtype {string | numpy.dtype} -- Optional. Numeric type of the pressure
+        array. One of storage.STORAGE.
+
+        scale {float} -- Optional. Scale factor if dtype is an integer type.
+
+        geometry {tuple int} -- Optional. (levels, sectors) of 3D sensors.
+
+        progress {function} -- Optional. Called as progress(bytes_read,
+        bytes_total, rows_read) while the rows are parsed.
+
+        cancel {threading.Event} -- Optional. Raises Cancelled when set.
+
+        Returns:
+        --------
+        df_HRM {pandas dataframe} -- dataframe containing the pressure data.
+        Index is the time stamp and columns are the sensor numbers.
+
+        values_3d {numpy array | None} -- pressures of the 3D sensors of shape
+        (time, level, sector). None if the file is not a 3D file.
+    """
+
+    dtype = np.dtype(dtype)
+    width, shape_3d = layout(names, geometry)
+
+    times = np.empty(rows, dtype="float64")
+    values = np.empty((rows, width), dtype=dtype)
+    values_3d = np.empty((rows,) + shape_3d, dtype=dtype) if shape_3d else None
+
+    # Fill the arrays a chunk of rows at a time
+    filled = 0
+    section = Section(file, end, progress, cancel)
+    for chunk in _read_chunks(section, names):
+        count = len(chunk)
+        if filled + count > rows:
+            # More rows than counted (should not occur). Grow the arrays.
+            times = grow(times, filled + count)
+            values = grow(values, filled + count)
+            if shape_3d:
+                values_3d = grow(values_3d, filled + count)
+        block = chunk.to_numpy()
+        times[filled:filled + count] = chunk.index.values
+        values[filled:filled + count] = storage.encode(block[:, :width],
+                                                       dtype, scale)
+        if shape_3d:
+            values_3d[filled:filled + count] = storage.encode(
+                block[:, width:], dtype, scale).reshape((count,) + shape_3d)
+        filled += count
+
+    df_HRM = frame(times[:filled], values[:filled], names[:width + 1])
+    if shape_3d:
+        return df_HRM, values_3d[:filled]
+    return df_HRM, None
+
+
+def layout(names, geometry=None):
+    """
+        Splits the columns of a header into the standard sensors and the 3D
+        sensors.
+
+        Arguments:
+        ----------
+        names {list string} -- column names from the header row.
+
+        geometry {tuple int} -- Optional. (levels, sectors) of 3D sensors.
+
+        Returns:
+        --------
+        width {int} -- number of standard sensor columns.
+
+        shape_3d {tuple int | None} -- (levels, sectors) if the file has the
+        3D HRM layout, otherwise None.
+    """
+
+    width = len(names) - 1
+    if geometry and width == SENSORS + geometry[0] * geometry[1]:
+        return SENSORS, (int(geometry[0]), int(geometry[1]))
+    return width, None
+
+
+def read_annotations(file):
+    """
+        Parses the annotation rows. The file must be positioned at the
+        "Annotations:" row.
+
+        Arguments:
+        ----------
+        file {binary file object} -- file positioned at the marker row.
+
+        Returns:
+        --------
+        df_ann {pandas dataframe} -- dataframe containing the annotations.
+        Index is the time stamp and the single column is the text.
+    """
+
+    # Skip the marker row
+    file.readline()
+
+    try:
+        df_ann = pd.read_csv(file, sep="\t", header=None,
+                             names=["Time", "Text"], usecols=[0, 1],
+                             index_col=0,
+                             dtype={"Time": "float64", "Text": "object"},
+                             encoding="latin-1")
+    except pd.errors.EmptyDataError:
+        df_ann = empty_annotations()
+
+    # Keep the annotations sorted by time so they can be searched
+    return df_ann.sort_index(kind="stable")
+
+
+def read_text(file_path, dtype="float64", scale=None, geometry=GEOMETRY_3D,
+              progress=None, cancel=None):
+    """
+        Reads a complete HRM text file. Finds the byte offset of the annotation
+        marker first, then parses the pressure block into a numeric array and
+        the annotation block separately. Compressed files are decompressed
+        while they are read.
+
+        Arguments:
+        ----------
+        file_path {string} -- path of the txt file.
+
+        dtype {string | numpy.dtype} -- Optional. Numeric type of the pressure
+        array. One of storage.STORAGE.
+
+        scale {float} -- Optional. Scale factor if dtype is an integer type.
+
+        geometry {tuple int} -- Optional. (levels, sectors) of the 3D sensors
+        used to detect and arrange 3D files. None disables 3D detection.
+
+        progress {function} -- Optional. Called as progress(bytes_read,
+        bytes_total, rows_read) while the pressure rows are parsed.
+
+        cancel {threading.Event} -- Optional. Raises Cancelled when set.
+
+        Returns:
+        --------
+        df_HRM {pandas dataframe} -- pressure data indexed by time.
+
+        df_ann {pandas dataframe} -- annotations indexed by time.
+
+        values_3d {numpy array | None} -- 3D sensor pressures of shape (time,
+        level, sector) sharing the time index of df_HRM. None for files
+        without 3D sensors.
+    """
+
+    with open_source(file_path) as file:
+        names = check_header(read_header(file), file_path)
+        offset, lines = scan(file, cancel)
+        df_HRM, values_3d = read_pressures(file, offset, lines, names, dtype,
+                                           scale, geometry, progress, cancel)
+        file.seek(offset)
+        df_ann = read_annotations(file)
+
+    return df_HRM, df_ann, values_3d
+
+
+def iter_text(file_path, chunk_seconds, dtype="float64"):
+    """
+        Streams a HRM text file as fixed duration blocks. Only one block of
+        pressure rows and the annotation block are held in memory at a time.
+
+        Arguments:
+        ----------
+        file_path {string} -- path of the txt file.
+
+        chunk_seconds {float} -- duration of each block in seconds.
+
+        dtype {string | numpy.dtype} -- Optional. Numeric type of the pressure
+        arrays. Either "float64" or "float32". The blocks hold pressures in
+        mmHg, so fixed point integer storage is not accepted.
+
+        Yields:
+        -------
+        Z {pandas dataframe} -- pressure data of the block indexed by time.
+        Same layout as the output of HRM.get_segment. The 3D sensors of 3D
+        files are kept as further columns.
+
+        ann {pandas dataframe} -- annotations that fall inside the block.
+    """
+
+    if chunk_seconds <= 0:
+        raise Exception("chunk_seconds must be greater than 0.")
+
+    dtype, scale = storage.check(dtype)
+    if scale is not None:
+        raise Exception(f"Streamed blocks hold pressures in mmHg. dtype must "
+                        f"be float64 or float32, not {dtype}.")
+    with open_source(file_path) as file:
+        names = check_header(read_header(file), file_path)
+        start = file.tell()
+        offset, _ = scan(file)
+
+        # The annotations are stored after the pressure data. Read them first
+        # so each block can be paired with its annotations.
+        file.seek(offset)
+        df_ann = read_annotations(file)
+        ann_times = df_ann.index.values
+        file.seek(start)
+
+        # Rows of the block currently being assembled
+        times, values = [], []
+        # Each block starts exactly where the previous one ended so an
+        # annotation on a boundary is never lost to rounding
+        origin, block, block_start, block_end = None, 1, None, None
+        for chunk in _read_chunks(Section(file, offset), names):
+            chunk_times = chunk.index.values
+            chunk_values = chunk.to_numpy(dtype=dtype)
+            if origin is None and len(chunk_times):
+                origin = chunk_times[0]
+                block_start, block_end = origin, origin + chunk_seconds
+
+            # Emit every block that ends inside this chunk of rows
+            while len(chunk_times) and chunk_times[-1] >= block_end:
+                split = np.searchsorted(chunk_times, block_end, side="left")
+                times.append(chunk_times[:split])
+                values.append(chunk_values[:split])
+                yield _block(times, values, names, df_ann, ann_times,
+                             block_start, block_end)
+                times, values = [], []
+                chunk_times = chunk_times[split:]
+                chunk_values = chunk_values[split:]
+                block += 1
+                block_start, block_end = (block_end,
+                                          origin + block * chunk_seconds)
+            times.append(chunk_times)
+            values.append(chunk_values)
+
+        # Emit the final partial block
+        if block_end is not None and sum(len(t) for t in times):
+            yield _block(times, values, names, df_ann, ann_times,
+                         block_start, block_end)
+
+
+def empty_annotations():
+    """
+        Returns an annotation dataframe without any rows.
+    """
+
+    index = pd.Index([], dtype="float64", name="Time")
+    return pd.DataFrame({"Text": pd.Series([], dtype="object")}, index=index)
+
+
+def _read_chunks(section, names):
+    """
+        Iterates over the pressure rows of section in dataframes of CHUNK_ROWS
+        rows. The time column is used as the index.
+    """
+
+    dtypes = {name: "float64" for name in names}
+    # Keep the size of a chunk roughly constant for wide 3D files.
+    rows = max(CHUNK_ROWS * (SENSORS + 1) // len(names), 1024)
+    try:
+        reader = pd.read_csv(section, sep="\t", header=None, names=names,
+                             usecols=range(len(names)), index_col=0,
+                             dtype=dtypes, chunksize=rows)
+    except pd.errors.EmptyDataError:
+        return
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def frame(times, values, names):
+    """
+        Wraps the time and pressure arrays in a dataframe without copying.
+    """
+
+    index = pd.Index(times, name="Time", copy=False)
+    columns = [int(name) for name in names[1:]]
+    return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+
+def _block(times, values, names, df_ann, ann_times, block_start, block_end):
+    """
+        Joins the collected rows of a streamed block and selects the
+        annotations that fall inside it.
+    """
+
+    Z = frame(np.concatenate(times), np.concatenate(values), names)
+    first, last = np.searchsorted(ann_times, (block_start, block_end))
+    return Z, df_ann.iloc[first:last]
+
+
+def grow(array, rows):
+    """
+        Returns a copy of array extended along the first axis to rows.
+    """
+
+    grown = np.empty((rows,) + array.shape[1:], dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
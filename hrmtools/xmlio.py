@@ -0,0 +1,103 @@
+from xml.etree.ElementTree import iterparse
+import numpy as np
+import pandas as pd
+from . import ctime, textio
+
+
+def read_annotations(file_path, tag="Annotation", time_key="Time",
+                     text_key="Text"):
+    """
+        Streams the annotation elements of an xml file into a dataframe. Each
+        element is discarded as soon as it has been read so memory use does
+        not depend on the size of the file. Compressed files are decompressed
+        while they are read.
+
+        The time and text of an annotation element are taken from its
+        attributes or, if missing, from child elements of the same name. If
+        there is no text attribute or child the text of the element itself is
+        used. Times can be given in SS.SS or MM:SS.SS.
+
+        Arguments:
+        ----------
+        file_path {string} -- path of the xml file.
+
+        tag {string} -- Optional. Name of the annotation elements. Namespaces
+        are ignored.
+
+        time_key {string} -- Optional. Name of the time attribute or child.
+
+        text_key {string} -- Optional. Name of the text attribute or child.
+
+        Returns:
+        --------
+        df_ann {pandas dataframe} -- annotations indexed by time.
+    """
+
+    times, texts = [], []
+    with textio.open_source(file_path) as file:
+        # Keep the chain of open elements so processed elements can be
+        # removed from their parent. inside counts the open annotation
+        # elements, whose children are needed until the annotation ends.
+        parents = []
+        inside = 0
+        for event, elem in iterparse(file, events=("start", "end")):
+            is_tag = _local(elem.tag) == tag
+            if event == "start":
+                parents.append(elem)
+                inside += is_tag
+                continue
+            parents.pop()
+            inside -= is_tag
+            if inside:
+                continue
+
+            if is_tag:
+                time = _value(elem, time_key)
+                if time is not None:
+                    text = _value(elem, text_key)
+                    if text is None:
+                        text = _text(elem)
+                    times.append(time.strip())
+                    texts.append(text)
+
+            # Drop every processed element from the tree, not only
+            # annotations, so other markers do not accumulate.
+            elem.clear()
+            if parents:
+                parents[-1].remove(elem)
+
+    # Convert all times at once. Repeated time strings are parsed once.
+    index = pd.Index(ctime.seconds_array(np.array(times, dtype=str)),
+                     name="Time")
+    return pd.DataFrame({"Text": pd.Series(texts, index=index,
+                                           dtype="object")})
+
+
+def _local(tag):
+    """
+        Removes the namespace from an element tag.
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def _text(elem):
+    """
+        Returns the text directly inside elem, ignoring its child elements.
+    """
+
+    parts = [elem.text or ""] + [child.tail or "" for child in elem]
+    return "".join(parts).strip()
+
+
+def _value(elem, key):
+    """
+        Returns an attribute of elem or the text of a child element named key.
+    """
+
+    value = elem.get(key)
+    if value is not None:
+        return value
+    for child in elem:
+        if _local(child.tag) == key:
+            return child.text or ""
+    return None
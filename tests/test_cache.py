@@ -0,0 +1,86 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from hrmtools import textio
+from hrmtools.cache import Cache
+from hrmtools.hrm import HRM
+
+
+def write(path, offset=0.0, rows=200):
+    """
+        Writes a small HRM text file whose pressures are shifted by offset.
+    """
+
+    times = np.arange(rows) / 100
+    values = np.tile(np.arange(36, dtype="float64"), (rows, 1)) + offset
+    df_ann = pd.DataFrame({"Text": ["WS"]}, index=pd.Index([0.5], name="Time"))
+    with open(path, "w", newline="") as file:
+        textio.write_text(file, [(times, values)], list(range(1, 37)), df_ann)
+
+
+@pytest.fixture
+def setup(tmp_path):
+    path = str(tmp_path / "rec.txt")
+    write(path)
+    cache = Cache(cache_dir=str(tmp_path / "cache"))
+    H = HRM()
+    H.import_data.cache = cache
+    return path, cache, H
+
+
+def test_import_is_cached(setup, monkeypatch):
+    path, cache, H = setup
+    assert cache.load(path) is None
+
+    H.import_data.from_text(path)
+    assert os.path.exists(cache.path_for(path))
+    df_HRM, df_ann, values_3d = cache.load(path)
+    pd.testing.assert_frame_equal(df_HRM, H.data.pressures,
+                                  check_index_type=False)
+    assert df_ann["Text"].tolist() == ["WS"]
+    assert values_3d is None
+
+    # A second import is served from the cache without parsing the text
+    def fail(*args, **kwargs):
+        raise AssertionError("The text file was parsed again.")
+    monkeypatch.setattr(textio, "read_text", fail)
+    H2 = HRM()
+    H2.import_data.cache = cache
+    H2.import_data.from_text(path)
+    pd.testing.assert_frame_equal(H2.data.pressures, H.data.pressures)
+
+
+def test_cache_invalid_after_source_changes(setup):
+    path, cache, H = setup
+    H.import_data.from_text(path)
+
+    # Different size
+    write(path, offset=100.0, rows=250)
+    assert cache.load(path) is None
+    H.import_data.from_text(path)
+    assert H.data.shape == (250, 36)
+    assert H.data.pressures.iloc[0, 0] == 100.0
+
+
+def test_cache_invalid_after_same_size_change(setup):
+    path, cache, H = setup
+    H.import_data.from_text(path)
+
+    # Same size, different content and a later modification time
+    write(path, offset=1.0)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.load(path) is None
+    H.import_data.from_text(path)
+    assert H.data.pressures.iloc[0, 0] == 1.0
+
+
+def test_cache_valid_after_touch(setup):
+    path, cache, H = setup
+    H.import_data.from_text(path)
+
+    # A new modification time with the same content keeps the cache
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cache.load(path) is not None
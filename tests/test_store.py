@@ -0,0 +1,132 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hrmtools import storage, textio
+from hrmtools.hrm import HRM
+from hrmtools.store import ChunkedStore, MemmapStore
+
+
+COLUMNS = list(range(1, 37))
+
+
+@pytest.fixture
+def recording():
+    """
+        Ten seconds of 36 sensor pressures at 100 Hz and two annotations.
+    """
+
+    times = np.arange(1000) / 100
+    rng = np.random.default_rng(0)
+    values = np.round(rng.normal(20, 30, (1000, 36)), 2)
+    df_HRM = textio.frame(times, values, ["Time"] + [str(c) for c in COLUMNS])
+    df_ann = pd.DataFrame({"Text": ["WS", "Rest"]},
+                          index=pd.Index([1.5, 7.25], name="Time"))
+    return df_HRM, df_ann
+
+
+def blocks(df_HRM, rows):
+    """
+        Splits the pressures into blocks of rows like Data.blocks.
+    """
+
+    times, values = df_HRM.index.values, df_HRM.to_numpy()
+    for first in range(0, len(times), rows):
+        yield times[first:first + rows], values[first:first + rows]
+
+
+@pytest.mark.parametrize("window", [(0.95, 2.05), (3.0, 4.0), (0.0, 10.0),
+                                    (9.5, 20.0), (-5.0, 0.5)])
+def test_chunked_segments_across_chunk_boundaries(tmp_path, recording,
+                                                  window):
+    df_HRM, df_ann = recording
+    path = str(tmp_path / "rec.hrmb")
+    # Blocks that do not line up with the one second chunks
+    store = ChunkedStore.create(path, blocks(df_HRM, 333), COLUMNS, df_ann,
+                                chunk_seconds=1)
+    assert len(store.counts) == 10
+
+    start, end = window
+    expected = df_HRM.loc[(df_HRM.index >= start) & (df_HRM.index < end),
+                          [2, 17, 36]]
+    Z = store.segment(start, end, [2, 17, 36])
+    np.testing.assert_array_equal(Z.index.values, expected.index.values)
+    np.testing.assert_array_equal(Z.to_numpy(), expected.to_numpy())
+    np.testing.assert_array_equal(store.times, df_HRM.index.values)
+    assert store.annotations["Text"].tolist() == ["WS", "Rest"]
+
+
+def test_chunked_int16(tmp_path, recording):
+    df_HRM, df_ann = recording
+    path = str(tmp_path / "rec.hrmb")
+    values = storage.encode(df_HRM.to_numpy(), "int16", 0.1)
+    ChunkedStore.create(path, [(df_HRM.index.values, values)], COLUMNS,
+                        df_ann, scale=0.1, chunk_seconds=2)
+
+    H = HRM()
+    H.import_data.from_binary(path)
+    assert H.data.storage == "int16"
+    assert H.data.scale == 0.1
+    Z, _ = H.get_segment((2.5, 6.5), COLUMNS)
+    expected = df_HRM.loc[(df_HRM.index >= 2.5) & (df_HRM.index < 6.5)]
+    np.testing.assert_allclose(Z.to_numpy(), expected.to_numpy(), atol=0.05)
+    assert H.data.annotations["Text"].tolist() == ["WS", "Rest"]
+
+
+def test_chunked_empty(tmp_path):
+    path = str(tmp_path / "empty.hrmb")
+    store = ChunkedStore.create(path, [], COLUMNS)
+    assert store.rows == 0
+    assert store.empty
+    assert store.segment(0, 10, [1, 2]).shape == (0, 2)
+
+    H = HRM()
+    H.import_data.from_binary(path)
+    assert H.data.empty
+    assert H.data.annotations.empty
+
+
+def test_binary_round_trip(tmp_path, recording):
+    df_HRM, df_ann = recording
+    H = HRM()
+    H.data.pressures = df_HRM
+    H.data.annotations = df_ann
+    path = str(tmp_path / "rec.hrmb")
+    assert H.data.save_to_binary(path, chunk_seconds=3,
+                                 metadata={"patient": "A"})
+
+    H2 = HRM()
+    H2.import_data.from_binary(path)
+    assert H2.data.store.metadata == {"patient": "A"}
+    pd.testing.assert_frame_equal(H2.data.pressures, df_HRM,
+                                  check_index_type=False)
+
+
+def test_memmap_create(tmp_path, recording):
+    df_HRM, df_ann = recording
+    path = str(tmp_path / "rec.hrmmap")
+    store = MemmapStore.create(path, df_HRM, df_ann)
+    assert store.shape == (1000, 36)
+
+    Z = store.segment(4.0, 4.5, [5, 6])
+    np.testing.assert_array_equal(Z.to_numpy(),
+                                  df_HRM.iloc[400:450][[5, 6]].to_numpy())
+    assert store.annotations.index.tolist() == [1.5, 7.25]
+    assert store.annotations["Text"].tolist() == ["WS", "Rest"]
+
+
+def test_from_memmap(tmp_path, recording):
+    df_HRM, df_ann = recording
+    H = HRM()
+    H.data.pressures = df_HRM
+    H.data.annotations = df_ann
+    path = str(tmp_path / "rec.hrmmap")
+    H.data.to_memmap(path)
+    assert isinstance(H.data.store, MemmapStore)
+
+    H2 = HRM()
+    H2.import_data.from_memmap(path)
+    Z, ann = H2.get_segment((1.0, 2.0), [1, 36])
+    np.testing.assert_array_equal(Z.to_numpy(),
+                                  df_HRM.iloc[100:200][[1, 36]].to_numpy())
+    assert ann["Text"].tolist() == ["WS"]
+    pd.testing.assert_frame_equal(H2.data.pressures, df_HRM)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hrmtools import textio
+from hrmtools.store import TextStore
+
+
+ROWS = 50
+
+
+@pytest.fixture
+def text_file(tmp_path):
+    """
+        Small HRM text file with 36 sensors and two annotations.
+    """
+
+    times = np.arange(ROWS) / 100
+    values = np.arange(ROWS * 36, dtype="float64").reshape(ROWS, 36)
+    df_ann = pd.DataFrame({"Text": ["WS", "Rest"]},
+                          index=pd.Index([0.1, 0.3], name="Time"))
+    path = tmp_path / "hrm.txt"
+    with open(path, "w", newline="") as file:
+        textio.write_text(file, [(times, values)], list(range(1, 37)), df_ann)
+    return path
+
+
+@pytest.mark.parametrize("split", range(0, len(textio.MARKER) + 1))
+def test_marker_split_across_blocks(text_file, monkeypatch, split):
+    # Place a block boundary split bytes into the "Annotations:" row
+    raw = text_file.read_bytes()
+    header = raw.find(b"\n") + 1
+    marker = raw.find(b"\n" + textio.MARKER) + 1
+    monkeypatch.setattr(textio, "BLOCK_SIZE", marker - header + split)
+
+    with open(text_file, "rb") as file:
+        file.seek(header)
+        offset, rows, row_offsets, row_times = textio.index_rows(file, 16)
+    assert offset == marker
+    assert rows == ROWS
+    assert row_times.tolist() == [0.0, 0.16, 0.32, 0.48]
+
+    store = TextStore(str(text_file), every=16)
+    assert store.rows == ROWS
+    assert store.annotations["Text"].tolist() == ["WS", "Rest"]